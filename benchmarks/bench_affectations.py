@@ -0,0 +1,84 @@
+"""Benchmark de l'ajout d'affectations : concaténation ligne par ligne vs ajout par lot
+
+Usage : python benchmarks/bench_affectations.py
+
+Ajoute NB_AGENTS agents à une course sur un historique de 10 000 et 100 000 lignes.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from moteur import MoteurTransport
+from stockage import COLONNES_AFFECTATIONS, JournalAffectations
+
+TAILLES_HISTORIQUE = [10000, 100000]
+NB_AGENTS = 30
+CHAUFFEURS = ['SAMIR', 'ADEL', 'FATHI', 'SAIID', 'Taxi']
+
+
+def generer_historique(nb_lignes):
+    """Historique synthétique d'affectations au format de df_chauffeurs"""
+    return pd.DataFrame({
+        'Chauffeur': [random.choice(CHAUFFEURS) for _ in range(nb_lignes)],
+        'Heure': [random.choice(['6h', '7h', '8h', '22h']) for _ in range(nb_lignes)],
+        'Agent': [f"Agent {i % 2000}" for i in range(nb_lignes)],
+        'Adresse': "Adresse non renseignée",
+        'Telephone': "Tél non renseigné",
+        'Societe': [random.choice(['Hannibal', 'Astragale']) for _ in range(nb_lignes)],
+        'Vehicule': "Non renseigné",
+        'Type_Transport': "Ramassage",
+        'Jour': "Lundi",
+        'Date_Ajout': "01/01/2026 08:00",
+        'Date_Reelle': [f"{1 + i % 28:02d}/{1 + i % 12:02d}/2026" for i in range(nb_lignes)],
+        'Prix_Course': 10,
+        'Statut_Paiement': "Non payé",
+    }, columns=COLONNES_AFFECTATIONS)
+
+
+def preparer_gestion(historique, dossier):
+    """Moteur sans Streamlit ni fichiers réels, avec un journal dans un dossier temporaire"""
+    gestion = MoteurTransport()
+    stockage = JournalAffectations(os.path.join(dossier, "affectations.xlsx"))
+    stockage.df = historique
+    stockage.prochain_id = len(historique)
+    gestion.initialiser_donnees(stockage)
+    return gestion
+
+
+def ajout_ligne_par_ligne(gestion, agents):
+    """Ancien chemin : un DataFrame d'une ligne et un pd.concat par agent"""
+    for ligne in gestion.construire_affectations("SAMIR", "7h", agents, "Ramassage", "Lundi"):
+        gestion.df_chauffeurs = pd.concat([gestion.df_chauffeurs, pd.DataFrame([ligne])], ignore_index=True)
+
+
+def main():
+    random.seed(0)
+    agents = [f"Nouvel agent {i}" for i in range(NB_AGENTS)]
+
+    print(f"{'historique':>10} | {'ligne par ligne (ms)':>20} | {'par lot (ms)':>12}")
+    for taille in TAILLES_HISTORIQUE:
+        historique = generer_historique(taille)
+
+        with tempfile.TemporaryDirectory() as dossier:
+            gestion = preparer_gestion(historique, dossier)
+            debut = time.perf_counter()
+            ajout_ligne_par_ligne(gestion, agents)
+            duree_lignes = time.perf_counter() - debut
+
+            # Le chemin par lot inclut l'écriture dans le journal
+            gestion = preparer_gestion(historique, dossier)
+            debut = time.perf_counter()
+            gestion.ajouter_affectations_lot([("SAMIR", "7h", agents, "Ramassage", "Lundi")])
+            duree_lot = time.perf_counter() - debut
+
+        print(f"{taille:>10} | {duree_lignes * 1000:>20.1f} | {duree_lot * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Benchmark de la recherche d'agents dans l'annuaire (info.xlsx)
+
+Usage : python benchmarks/bench_annuaire.py
+
+Le temps par recherche doit rester constant quand l'annuaire grossit.
+"""
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from moteur import MoteurTransport
+
+TAILLES = [500, 2000, 10000, 50000]
+NB_RECHERCHES = 20000
+
+
+def generer_annuaire(nb_agents):
+    """Génère un annuaire synthétique au format de info.xlsx"""
+    return pd.DataFrame({
+        'voyant': [f"Agent {i} (NOM {i})" for i in range(nb_agents)],
+        'adresse': [f"{i} rue du test" for i in range(nb_agents)],
+        'Mobile': [20000000 + i for i in range(nb_agents)],
+        'societe': [random.choice(['Hannibal', 'Astragale']) for _ in range(nb_agents)],
+        'voiture': [random.choice(['oui', 'non', 'non', 'non']) for _ in range(nb_agents)],
+    })
+
+
+def main():
+    random.seed(0)
+    # Moteur seul : pas de lecture de info.xlsx ni de session Streamlit
+    gestion = MoteurTransport()
+
+    print(f"{'agents':>8} | {'indexation (ms)':>16} | {'recherche (µs)':>15}")
+    for taille in TAILLES:
+        gestion.df_info = generer_annuaire(taille)
+
+        debut = time.perf_counter()
+        gestion.indexer_infos_agents()
+        duree_index = time.perf_counter() - debut
+
+        indices = [random.randrange(taille) for _ in range(NB_RECHERCHES)]
+        noms = [f"Agent {i} (NOM {i})" for i in indices]
+        debut = time.perf_counter()
+        for nom in noms:
+            gestion.get_info_agent(nom)
+        duree_recherche = time.perf_counter() - debut
+
+        print(f"{taille:>8} | {duree_index * 1000:>16.1f} | {duree_recherche / NB_RECHERCHES * 1e6:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
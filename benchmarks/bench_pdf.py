@@ -0,0 +1,98 @@
+"""Benchmark de la liste imprimable PDF (construire_pdf_imprimable)
+
+Usage : python benchmarks/bench_pdf.py
+
+Rend une semaine de ramassage pour NB_AGENTS agents ; l'objectif est de rester sous la seconde.
+Le rendu platypus en un seul grand tableau par jour (découpage automatique de ReportLab) sert de référence.
+"""
+import os
+import random
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
+
+from moteur import COLONNES_PDF, JOURS_SEMAINE, MoteurTransport
+
+NB_AGENTS = 2000
+OBJECTIF_SECONDES = 1.0
+
+
+def generer_liste(nb_agents):
+    """Liste de ramassage synthétique au format de liste_ramassage_actuelle, triée par (jour, heure)"""
+    liste = []
+    for jour in JOURS_SEMAINE:
+        for i in range(nb_agents):
+            heure = random.choice([6, 7, 8, 22])
+            liste.append({
+                'Agent': f"Agent {i} (NOM {i})",
+                'Jour': jour,
+                'Heure': heure,
+                'Heure_affichage': f"{heure}h",
+                'Adresse': f"{i} rue du test, cité {i % 40}",
+                'Telephone': str(20000000 + i),
+                'Societe': random.choice(['Hannibal', 'Astragale']),
+                'Voiture': "Non",
+                'Date_Reelle': "01/01/2026",
+            })
+    liste.sort(key=lambda agent: (JOURS_SEMAINE.index(agent['Jour']), agent['Heure']))
+    return liste
+
+
+def preparer_gestion(liste):
+    """Moteur sans Streamlit ni fichiers réels"""
+    gestion = MoteurTransport()
+    gestion.empreinte_planning = "bench"
+    gestion.liste_ramassage_actuelle = liste
+    gestion.parametres_traitement = {'heure_ete_active': False, 'jour_selectionne': 'Tous',
+                                     'heures_ramassage': [6, 7, 8, 22], 'heures_depart': []}
+    return gestion
+
+
+def pdf_un_tableau_par_jour(gestion, liste):
+    """Référence : un seul Table par jour, découpé en pages par ReportLab"""
+    style = TableStyle([
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f77b4')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0f2f6')]),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+    ])
+    entete = [colonne[0] for colonne in COLONNES_PDF]
+    elements = []
+    for _, agents in gestion.grouper_liste_par_jour(liste):
+        tableau = Table([entete] + [[str(agent[cle]) for _, cle, _, _ in COLONNES_PDF] for agent in agents], repeatRows=1)
+        tableau.setStyle(style)
+        elements.append(tableau)
+    sortie = BytesIO()
+    SimpleDocTemplate(sortie, pagesize=A4).build(elements)
+    return sortie.getvalue()
+
+
+def main():
+    random.seed(0)
+    liste = generer_liste(NB_AGENTS)
+    gestion = preparer_gestion(liste)
+
+    debut = time.perf_counter()
+    pdf = gestion.construire_pdf_imprimable("ramassage", "Tous", *gestion.obtenir_liste_imprimable("ramassage"))
+    duree = time.perf_counter() - debut
+
+    debut = time.perf_counter()
+    pdf_un_tableau_par_jour(gestion, liste)
+    duree_reference = time.perf_counter() - debut
+
+    print(f"{len(liste)} lignes, PDF de {len(pdf) / 1024:.0f} Ko")
+    print(f"{'canevas (s)':>22} | {'un tableau par jour (s)':>24}")
+    print(f"{duree:>22.2f} | {duree_reference:>24.2f}")
+    print("objectif atteint" if duree < OBJECTIF_SECONDES else f"objectif de {OBJECTIF_SECONDES} s dépassé")
+
+
+if __name__ == "__main__":
+    main()
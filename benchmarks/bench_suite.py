@@ -0,0 +1,246 @@
+"""Suite de benchmarks des chemins critiques, sur des données synthétiques
+
+Usage :
+    python benchmarks/bench_suite.py --sortie resultats.json
+    python benchmarks/bench_suite.py --agents 200 1000 --reference resultats.json
+
+Pour chaque taille : un planning de N agents sur 7 jours, l'annuaire info.xlsx
+correspondant et un historique d'affectations sur plusieurs mois, écrits dans
+un dossier temporaire. Chaque mesure garde toutes ses exécutions et le meilleur
+temps ; avec --reference, les écarts avec un fichier de résultats précédent
+sont affichés (régression au-delà de --seuil).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from moteur import JOURS_SEMAINE, MoteurTransport, preparer_annuaire
+from stockage import COLONNES_AFFECTATIONS, JournalAffectations, StockageSQLite
+
+# Horaires du planning et poids relatifs (une semaine type d'un centre d'appels)
+HORAIRES = [
+    ("7h-16h", 18), ("8h-17h", 12), ("6h-15h", 8), ("9h-18h", 6), ("14h-23h", 14), ("13h-22h", 6),
+    ("15h-00h", 4), ("16h-1h", 3), ("22h-7h", 6), ("REPOS", 18), ("CONGÉ PAYÉ", 2), ("MALADIE", 1), (None, 2),
+]
+HEURES_RAMASSAGE = [6, 7, 8, 22]
+HEURES_DEPART = [22, 23, 0, 1, 2, 3]
+SOCIETES = ['Hannibal', 'Astragale']
+
+AGENTS_PAR_DEFAUT = [200, 1000, 5000]
+# Un chauffeur pour 40 agents, au moins 3, plus le taxi
+AGENTS_PAR_CHAUFFEUR = 40
+AGENTS_PAR_COURSE = 4
+
+
+def nom_agent(i):
+    return f"NOM{i:05d} Prénom{i:05d}"
+
+
+def generer_planning(chemin, nb_agents, lundi):
+    """Classeur de planning au format attendu : titre, dates des jours, en-têtes puis un agent par ligne"""
+    horaires, poids = zip(*HORAIRES)
+    classeur = openpyxl.Workbook(write_only=True)
+    feuille = classeur.create_sheet("Planning")
+    feuille.append([f"PLANNING SEMAINE DU {lundi:%d/%m/%Y}"])
+    feuille.append([""] + [f"{jour[:3]} {lundi + timedelta(days=i):%d/%m}" for i, jour in enumerate(JOURS_SEMAINE)] + [""])
+    feuille.append(["Salarié"] + JOURS_SEMAINE + ["Qualification"])
+    for i in range(nb_agents):
+        feuille.append([nom_agent(i)] + random.choices(horaires, weights=poids, k=7) + ["Conseiller"])
+    classeur.save(chemin)
+
+
+def generer_annuaire(chemin, nb_agents):
+    """Annuaire info.xlsx des agents du planning ; les premiers ont une voiture (chauffeurs)"""
+    nb_chauffeurs = max(3, nb_agents // AGENTS_PAR_CHAUFFEUR)
+    pd.DataFrame({
+        'voyant': [nom_agent(i) for i in range(nb_agents)],
+        'adresse': [f"{i} rue de la Gare, Tunis" for i in range(nb_agents)],
+        'Mobile': [20000000 + i for i in range(nb_agents)],
+        'societe': [random.choice(SOCIETES) for _ in range(nb_agents)],
+        'voiture': ['oui' if i < nb_chauffeurs else 'non' for i in range(nb_agents)],
+    }).to_excel(chemin, index=False)
+    return [nom_agent(i) for i in range(nb_chauffeurs)] + ['Taxi']
+
+
+def generer_historique(nb_agents, chauffeurs, nb_mois, courses_par_mois, fin):
+    """Historique d'affectations sur les nb_mois précédant fin, courses_par_mois par agent et par mois"""
+    generateur = np.random.default_rng(0)
+    nb_lignes = nb_agents * courses_par_mois * nb_mois
+    debut = fin - timedelta(days=30 * nb_mois)
+    dates = [debut + timedelta(days=int(d)) for d in generateur.integers(0, (fin - debut).days, nb_lignes)]
+    agents = generateur.integers(0, nb_agents, nb_lignes)
+    chauffeurs_tires = generateur.integers(0, len(chauffeurs), nb_lignes)
+    ramassage = generateur.random(nb_lignes) < 0.5
+
+    return pd.DataFrame({
+        'Chauffeur': [chauffeurs[c] for c in chauffeurs_tires],
+        'Heure': [f"{random.choice(HEURES_RAMASSAGE if r else HEURES_DEPART)}h" for r in ramassage],
+        'Agent': [nom_agent(a) for a in agents],
+        'Adresse': [f"{a} rue de la Gare, Tunis" for a in agents],
+        'Telephone': [str(20000000 + a) for a in agents],
+        'Societe': [SOCIETES[a % 2] for a in agents],
+        'Vehicule': "Oui",
+        'Type_Transport': np.where(ramassage, "Ramassage", "Départ"),
+        'Jour': [JOURS_SEMAINE[d.weekday()] for d in dates],
+        'Date_Ajout': [f"{d:%d/%m/%Y} 08:00" for d in dates],
+        'Date_Reelle': [f"{d:%d/%m/%Y}" for d in dates],
+        'Prix_Course': [15 if chauffeurs[c] == 'Taxi' else 10 for c in chauffeurs_tires],
+        'Statut_Paiement': "Non payé",
+    }, columns=COLONNES_AFFECTATIONS)
+
+
+def mesurer(fonction, repetitions):
+    """Durées (s) de repetitions exécutions de fonction()"""
+    durees = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction()
+        durees.append(time.perf_counter() - debut)
+    return durees
+
+
+def mesurer_echelle(nb_agents, options, dossier):
+    """Toutes les mesures pour un planning de nb_agents agents ; renvoie la liste des résultats"""
+    random.seed(nb_agents)
+    fin = date.today().replace(day=1)
+    chemin_planning = os.path.join(dossier, f"planning_{nb_agents}.xlsx")
+    chemin_infos = os.path.join(dossier, f"info_{nb_agents}.xlsx")
+    generer_planning(chemin_planning, nb_agents, fin - timedelta(days=fin.weekday()))
+    chauffeurs = generer_annuaire(chemin_infos, nb_agents)
+    historique = generer_historique(nb_agents, chauffeurs, options.mois, options.courses_par_mois, fin)
+    mois, annee = (fin - timedelta(days=1)).month, (fin - timedelta(days=1)).year
+
+    resultats = []
+
+    def noter(mesure, durees, operations=1):
+        resultats.append({
+            'mesure': mesure,
+            'agents': nb_agents,
+            'lignes_historique': len(historique),
+            'operations': operations,
+            'meilleur_s': min(durees),
+            'moyenne_s': sum(durees) / len(durees),
+            'executions_s': durees,
+        })
+        print(f"{nb_agents:>7} | {mesure:<40} | {min(durees) * 1000:>12.1f}", flush=True)
+
+    gestion = MoteurTransport(fichier_infos=chemin_infos)
+    gestion.charger_infos_agents()
+    with open(chemin_planning, 'rb') as fichier:
+        contenu = fichier.read()
+
+    noter("preparer_annuaire", mesurer(lambda: preparer_annuaire(chemin_infos), options.repetitions))
+    noter("analyser_planning", mesurer(lambda: gestion.analyser_planning(contenu), options.repetitions))
+    gestion.df, gestion.dates_par_jour = gestion.analyser_planning(contenu)
+
+    for mode in ("colonnes", "lignes"):
+        gestion.mode_traitement = mode
+        noter(f"traiter_donnees[{mode}]", mesurer(
+            lambda: gestion.traiter_donnees(False, 'Tous', HEURES_RAMASSAGE, HEURES_DEPART), options.repetitions))
+    gestion.mode_traitement = "colonnes"
+
+    noms = gestion.df['Salarie'].astype(str).tolist()
+    noter("get_info_agent", mesurer(lambda: [gestion.get_info_agent(nom) for nom in noms], options.repetitions), len(noms))
+
+    # Ajout d'une course sur l'historique complet, pour chaque stockage (écriture sur disque comprise)
+    agents_course = noms[:AGENTS_PAR_COURSE]
+    fichier_journal = os.path.join(dossier, f"affectations_{nb_agents}.arrow")
+    journal = JournalAffectations(fichier_journal)
+    journal.remplacer(historique)
+    gestion.initialiser_donnees(journal)
+    noter("ajouter_affectation[journal]", mesurer(
+        lambda: gestion.ajouter_affectation(chauffeurs[0], "7h", agents_course, "Ramassage", "Lundi"), options.repetitions))
+    noter("sauvegarder_donnees_permanentes[journal]", mesurer(gestion.sauvegarder_donnees_permanentes, options.repetitions))
+    noter("charger[journal]", mesurer(lambda: JournalAffectations(fichier_journal), options.repetitions))
+
+    base = StockageSQLite(os.path.join(dossier, f"affectations_{nb_agents}.sqlite3"))
+    base.remplacer(historique)
+    gestion.initialiser_donnees(base)
+    noter("ajouter_affectation[sqlite]", mesurer(
+        lambda: gestion.ajouter_affectation(chauffeurs[0], "7h", agents_course, "Ramassage", "Lundi"), options.repetitions))
+
+    noter("reconstruire_agregats", mesurer(gestion.reconstruire_agregats, options.repetitions))
+    noter("calculer_statistiques_mensuelles", mesurer(
+        lambda: gestion.calculer_statistiques_mensuelles(mois, annee), options.repetitions))
+    noter("recalculer_statistiques_mensuelles", mesurer(
+        lambda: gestion.recalculer_statistiques_mensuelles(mois, annee), options.repetitions))
+    noter("exporter_suivi_chauffeurs", mesurer(lambda: gestion.exporter_suivi_chauffeurs('Tous'), options.repetitions))
+    noter("exporter_suivi_chauffeurs_xlsx", mesurer(lambda: gestion.exporter_suivi_chauffeurs_xlsx('Tous'), options.repetitions))
+    return resultats
+
+
+def comparer(resultats, chemin_reference, seuil):
+    """Affiche le rapport meilleur temps / meilleur temps de référence pour chaque mesure commune"""
+    with open(chemin_reference, encoding='utf-8') as fichier:
+        reference = {(r['mesure'], r['agents']): r for r in json.load(fichier)['resultats']}
+
+    nb_regressions = 0
+    print(f"\nComparaison avec {chemin_reference} (régression au-delà de ×{seuil})")
+    for resultat in resultats:
+        ancien = reference.get((resultat['mesure'], resultat['agents']))
+        if ancien is None:
+            continue
+        rapport = resultat['meilleur_s'] / ancien['meilleur_s'] if ancien['meilleur_s'] else float('inf')
+        regression = rapport > seuil
+        nb_regressions += regression
+        print(f"{resultat['agents']:>7} | {resultat['mesure']:<40} | ×{rapport:>6.2f}{'  ⚠️' if regression else ''}")
+    return nb_regressions
+
+
+def lire_options(arguments=None):
+    parseur = argparse.ArgumentParser(description="Benchmarks des chemins critiques sur des données synthétiques")
+    parseur.add_argument("--agents", type=int, nargs="+", default=AGENTS_PAR_DEFAUT, help="Tailles de planning (défaut : %(default)s)")
+    parseur.add_argument("--mois", type=int, default=6, help="Mois d'historique d'affectations (défaut : %(default)s)")
+    parseur.add_argument("--courses-par-mois", type=int, default=4, help="Courses par agent et par mois (défaut : %(default)s)")
+    parseur.add_argument("--repetitions", type=int, default=3, help="Exécutions par mesure (défaut : %(default)s)")
+    parseur.add_argument("--sortie", default="resultats_bench.json", help="Fichier JSON des résultats (défaut : %(default)s)")
+    parseur.add_argument("--reference", help="Résultats d'un lancement précédent à comparer")
+    parseur.add_argument("--seuil", type=float, default=1.2, help="Rapport de temps signalé comme régression (défaut : %(default)s)")
+    return parseur.parse_args(arguments)
+
+
+def main(arguments=None):
+    options = lire_options(arguments)
+    resultats = []
+
+    print(f"{'agents':>7} | {'mesure':<40} | {'meilleur (ms)':>12}")
+    with tempfile.TemporaryDirectory() as dossier:
+        for nb_agents in options.agents:
+            resultats.extend(mesurer_echelle(nb_agents, options, dossier))
+
+    with open(options.sortie, 'w', encoding='utf-8') as fichier:
+        json.dump({
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'environnement': {
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'numpy': np.__version__,
+                'openpyxl': openpyxl.__version__,
+                'plateforme': platform.platform(),
+                'processeurs': os.cpu_count(),
+            },
+            'parametres': {'agents': options.agents, 'mois': options.mois, 'courses_par_mois': options.courses_par_mois,
+                           'repetitions': options.repetitions},
+            'resultats': resultats,
+        }, fichier, ensure_ascii=False, indent=2)
+    print(f"Résultats écrits dans {options.sortie}")
+
+    if options.reference:
+        return 1 if comparer(resultats, options.reference, options.seuil) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""Génération des listes et rapports en ligne de commande, sans lancer Streamlit
+
+Usage :
+    python cli.py planning_s45.xlsx planning_s46.xlsx --sortie sorties/
+    python cli.py plannings/*.xlsx --infos info.xlsx --mois 11 --annee 2025 --pdf
+
+Pour chaque planning : listes de ramassage et de départ (Excel, et PDF avec --pdf)
+dans sorties/<nom du planning>/. Une fois par lancement : suivi des chauffeurs
+et rapport de paie du mois à partir des affectations enregistrées.
+Les plannings sont traités en parallèle, un processus par fichier.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from moteur import FICHIER_INFOS, JOURS_SEMAINE, FormatPlanningInvalide, MoteurTransport, ecrire_xlsx_flux
+from stockage import ouvrir_stockage
+
+HEURES_RAMASSAGE_PAR_DEFAUT = [6, 7, 8, 22]
+HEURES_DEPART_PAR_DEFAUT = [22, 23, 0, 1, 2, 3]
+
+
+def creer_gestion(options):
+    """Moteur avec l'annuaire options.infos et les prix de la ligne de commande (affectations en mémoire)"""
+    gestion = MoteurTransport(fichier_sauvegarde=options.affectations, type_stockage=options.stockage,
+                              fichier_infos=options.infos)
+    gestion.prix_course_chauffeur = options.prix_chauffeur
+    gestion.prix_course_taxi = options.prix_taxi
+    gestion.charger_infos_agents()
+    return gestion
+
+
+def ecrire_fichier(chemin, donnees):
+    with open(chemin, 'wb') as fichier:
+        fichier.write(donnees)
+    return chemin
+
+
+def traiter_planning(chemin_planning, options):
+    """Listes de ramassage et de départ d'un planning ; renvoie les fichiers écrits"""
+    gestion = creer_gestion(options)
+    with open(chemin_planning, 'rb') as fichier:
+        gestion.df, gestion.dates_par_jour = gestion.analyser_planning(fichier.read())
+    gestion.traiter_donnees(options.heure_ete, options.jour, options.heures_ramassage, options.heures_depart)
+
+    dossier = os.path.join(options.sortie, os.path.splitext(os.path.basename(chemin_planning))[0])
+    os.makedirs(dossier, exist_ok=True)
+
+    fichiers = []
+    for type_liste, nom in [("ramassage", "Liste_Ramassage"), ("depart", "Liste_Depart")]:
+        liste, heures = gestion.obtenir_liste_imprimable(type_liste)
+        if not liste:
+            continue
+        fichiers.append(ecrire_fichier(os.path.join(dossier, f"{nom}.xlsx"),
+                                       gestion.construire_rapport_imprimable(type_liste, options.jour, liste, heures)))
+        if options.pdf:
+            fichiers.append(ecrire_fichier(os.path.join(dossier, f"{nom}.pdf"),
+                                           gestion.construire_pdf_imprimable(type_liste, options.jour, liste, heures)))
+    return fichiers
+
+
+def traiter_affectations(options):
+    """Suivi des chauffeurs et rapport de paie du mois à partir des affectations enregistrées"""
+    gestion = creer_gestion(options)
+    # Lecture seule : l'application peut écrire dans le même stockage pendant le rapport
+    gestion.initialiser_donnees(ouvrir_stockage(options.stockage, options.affectations, lecture_seule=True))
+    if gestion.stockage.erreur_chargement is not None:
+        raise gestion.stockage.erreur_chargement
+    os.makedirs(options.sortie, exist_ok=True)
+
+    fichiers = []
+    suivi = gestion.exporter_suivi_chauffeurs_xlsx(options.jour)
+    if suivi is not None:
+        fichiers.append(ecrire_fichier(os.path.join(options.sortie, "Suivi_Chauffeurs.xlsx"), suivi))
+
+    rapport_paie = gestion.generer_rapport_paie_mensuel(options.mois, options.annee)
+    if rapport_paie is not None:
+        fichiers.append(ecrire_fichier(
+            os.path.join(options.sortie, f"Rapport_Paie_Transport_{options.mois}_{options.annee}.xlsx"),
+            ecrire_xlsx_flux(rapport_paie.itertuples(index=False, name=None), f'Paie_{options.mois}_{options.annee}')
+        ))
+    return fichiers
+
+
+def lire_options(arguments=None):
+    maintenant = datetime.now()
+    parseur = argparse.ArgumentParser(description="Listes de ramassage / départ, suivi des chauffeurs et paie, sans Streamlit")
+    parseur.add_argument("plannings", nargs="*", help="Classeurs de planning hebdomadaire (.xlsx)")
+    parseur.add_argument("--infos", default=FICHIER_INFOS, help="Annuaire des agents (défaut : %(default)s)")
+    parseur.add_argument("--sortie", default="sorties", help="Dossier des fichiers produits (défaut : %(default)s)")
+    parseur.add_argument("--jour", default="Tous", choices=['Tous'] + JOURS_SEMAINE)
+    parseur.add_argument("--heure-ete", action="store_true", help="Appliquer l'ajustement heure d'été")
+    parseur.add_argument("--heures-ramassage", type=int, nargs="+", default=HEURES_RAMASSAGE_PAR_DEFAUT)
+    parseur.add_argument("--heures-depart", type=int, nargs="+", default=HEURES_DEPART_PAR_DEFAUT)
+    parseur.add_argument("--pdf", action="store_true", help="Produire aussi les listes en PDF")
+    parseur.add_argument("--affectations", default="affectations_permanentes.arrow",
+                         help="Sauvegarde des affectations (défaut : %(default)s)")
+    parseur.add_argument("--stockage", default=os.environ.get("TRANSPORT_STOCKAGE", "journal"), choices=["journal", "sqlite"])
+    parseur.add_argument("--sans-affectations", action="store_true", help="Ne pas produire le suivi des chauffeurs ni la paie")
+    parseur.add_argument("--mois", type=int, default=maintenant.month, help="Mois du rapport de paie (défaut : mois courant)")
+    parseur.add_argument("--annee", type=int, default=maintenant.year, help="Année du rapport de paie (défaut : année courante)")
+    parseur.add_argument("--prix-chauffeur", type=float, default=10, help="Prix d'une course chauffeur (défaut : %(default)s)")
+    parseur.add_argument("--prix-taxi", type=float, default=15, help="Prix d'une course taxi (défaut : %(default)s)")
+    parseur.add_argument("--processus", type=int, default=None, help="Nombre de processus (défaut : nombre de cœurs)")
+    return parseur.parse_args(arguments)
+
+
+def main(arguments=None):
+    options = lire_options(arguments)
+    debut = time.perf_counter()
+    nb_echecs = 0
+
+    with ProcessPoolExecutor(max_workers=options.processus) as pool:
+        travaux = {pool.submit(traiter_planning, chemin, options): chemin for chemin in options.plannings}
+        if not options.sans_affectations:
+            travaux[pool.submit(traiter_affectations, options)] = options.affectations
+
+        for futur in as_completed(travaux):
+            source = travaux[futur]
+            try:
+                fichiers = futur.result()
+            except FormatPlanningInvalide as e:
+                nb_echecs += 1
+                print(f"❌ {source} : {e}", file=sys.stderr)
+                continue
+            except Exception as e:
+                nb_echecs += 1
+                print(f"❌ {source} : {type(e).__name__}: {e}", file=sys.stderr)
+                continue
+
+            print(f"✅ {source} : {len(fichiers)} fichier(s)")
+            for fichier in fichiers:
+                print(f"   {fichier}")
+
+    print(f"Terminé en {time.perf_counter() - debut:.1f} s")
+    return 1 if nb_echecs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
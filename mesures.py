@@ -0,0 +1,84 @@
+"""Instrumentation légère des chemins critiques : durées (spans) et compteurs
+
+    mesures = Mesures(actif=True)
+    with mesures.span("traiter_donnees"):
+        ...
+    mesures.compter("lignes_planning", len(df))
+
+Désactivée, span() renvoie un gestionnaire de contexte partagé qui ne fait
+rien et compter() s'arrête au premier test. Une exécution (un rerun Streamlit)
+commence par demarrer() ; releve() en donne le détail, que ecrire_journal()
+ajoute en une ligne JSON au journal.
+"""
+import json
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+SANS_MESURE = nullcontext()
+
+
+class Span:
+    """Durée d'un bloc, enregistrée dans les mesures à sa sortie"""
+    __slots__ = ('mesures', 'nom', 'debut', 'profondeur')
+
+    def __init__(self, mesures, nom):
+        self.mesures = mesures
+        self.nom = nom
+
+    def __enter__(self):
+        self.profondeur = self.mesures.profondeur
+        self.mesures.profondeur += 1
+        self.debut = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        fin = time.perf_counter()
+        self.mesures.profondeur -= 1
+        self.mesures.spans.append({
+            'nom': self.nom,
+            'debut_ms': (self.debut - self.mesures.origine) * 1000,
+            'duree_ms': (fin - self.debut) * 1000,
+            'profondeur': self.profondeur,
+        })
+        return False
+
+
+class Mesures:
+    """Spans et compteurs d'une exécution ; journal : fichier JSON lines (une ligne par exécution) ou None"""
+    def __init__(self, actif=False, journal=None):
+        self.actif = actif
+        self.journal = journal
+        self.demarrer()
+
+    def demarrer(self):
+        """Début d'une exécution : les spans et compteurs précédents sont oubliés"""
+        self.origine = time.perf_counter()
+        self.spans = []
+        self.compteurs = {}
+        self.profondeur = 0
+
+    def span(self, nom):
+        if not self.actif:
+            return SANS_MESURE
+        return Span(self, nom)
+
+    def compter(self, nom, nombre=1):
+        if self.actif:
+            self.compteurs[nom] = self.compteurs.get(nom, 0) + nombre
+
+    def releve(self):
+        """Spans (dans l'ordre de leur début) et compteurs de l'exécution en cours"""
+        return {
+            'horodatage': datetime.now().isoformat(timespec='milliseconds'),
+            'duree_ms': (time.perf_counter() - self.origine) * 1000,
+            'spans': sorted(self.spans, key=lambda span: span['debut_ms']),
+            'compteurs': dict(self.compteurs),
+        }
+
+    def ecrire_journal(self, releve, **contexte):
+        """Ajoute le relevé (et le contexte fourni) au journal s'il y en a un"""
+        if self.journal is None:
+            return
+        with open(self.journal, 'a', encoding='utf-8') as fichier:
+            fichier.write(json.dumps({**contexte, **releve}, ensure_ascii=False) + "\n")
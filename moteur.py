@@ -0,0 +1,1718 @@
+"""Moteur de gestion du transport, indépendant de l'interface
+
+Lecture du planning et de l'annuaire, listes de ramassage / départ,
+affectations, statistiques de paie et exports (Excel, PDF). Le module
+s'importe sans Streamlit ni ReportLab : app.py n'en est qu'une interface,
+cli.py et les processus de travail l'utilisent directement.
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from functools import lru_cache
+from io import BytesIO
+from itertools import groupby
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl.cell.cell import ERROR_CODES
+
+from mesures import Mesures
+from stockage import (COLONNE_TAXI, FORMAT_DATE_REELLE, StockageMemoire, affectations_texte, heure_du_creneau,
+                      lire_date_reelle, ouvrir_stockage)
+from travaux import GestionnaireTravaux, travail_liste_imprimable, travail_rapport_paie, travail_suivi_chauffeurs
+
+# Niveaux des messages de MoteurTransport.diagnostics
+NIVEAUX_DIAGNOSTIC = ('succes', 'info', 'avertissement', 'erreur')
+
+# Valeurs par défaut quand un agent est absent de info.xlsx
+INFOS_AGENT_PAR_DEFAUT = {"adresse": "Adresse non renseignée", "tel": "Tél non renseigné", "societe": "Société non renseignée", "voiture": "Non"}
+
+# Valeurs de la colonne "voiture" considérées comme "Oui"
+VALEURS_VOITURE_OUI = {'oui', 'yes', 'true', '1', 'x'}
+
+# Annuaire des agents (adresses, téléphones, sociétés, chauffeurs)
+FICHIER_INFOS = "info.xlsx"
+
+JOURS_SEMAINE = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+
+# Ligne vide des exports à 8 colonnes (suivi des chauffeurs)
+LIGNE_VIDE_SUIVI = ["", "", "", "", "", "", "", ""]
+
+# Listes imprimables PDF : (en-tête, clé de la liste, largeur en points, nombre de caractères max)
+COLONNES_PDF = [
+    ("Agent", 'Agent', 150, 34),
+    ("Heure", 'Heure_affichage', 40, 6),
+    ("Adresse", 'Adresse', 190, 44),
+    ("Téléphone", 'Telephone', 70, 14),
+    ("Société", 'Societe', 73, 16),
+]
+# Géométrie des listes PDF (points) : lignes de hauteur fixe, marges de page et de cellule
+MARGE_PAGE_PDF = 36
+HAUTEUR_LIGNE_PDF = 14
+MARGE_CELLULE_PDF = 6
+TAILLE_POLICE_PDF = 8
+# Couleurs (opérandes PDF RVB) : en-tête #1f77b4, une ligne sur deux #f0f2f6
+COULEUR_ENTETE_PDF = "0.122 0.467 0.706"
+COULEUR_LIGNE_ALTERNEE_PDF = "0.941 0.949 0.965"
+# Chaînes littérales PDF : parenthèses et barre oblique échappées, octets non ASCII en octal
+ECHAPPEMENTS_PDF = {
+    ord('('): '\\(', ord(')'): '\\)', ord('\\'): '\\\\',
+    **{code: ' ' for code in range(32)},
+    **{code: f'\\{code:03o}' for code in range(128, 256)},
+}
+
+# Codes de planning sans horaire (pas de transport)
+CODES_ABSENCE = ['REPOS', 'ABSENCE', 'OFF', 'MALADIE', 'CONGÉ PAYÉ', 'CONGÉ MATERNITÉ']
+
+# Plage horaire d'un planning : "7h-16h", "7h30-16h", "22h à 6h", "7:30-16:00"...
+# Une cellule peut en contenir plusieurs (horaire coupé : "7h-11h / 14h-18h")
+MOTIF_PLAGE = re.compile(r'(\d{1,2})\s*(?:[hH:]\s*(\d{2})?)?\s*[\-à]\s*(\d{1,2})\s*(?:[hH:]\s*(\d{2})?)?')
+
+# Planning : nombre de lignes d'en-tête (titre, dates des jours) avant celle des colonnes,
+# colonnes attendues et nombre d'agents par bloc lu
+LIGNES_ENTETE_PLANNING = 2
+COLONNES_PLANNING = ['Salarie'] + JOURS_SEMAINE + ['Qualification']
+TAILLE_BLOC_PLANNING = 1000
+
+class FormatPlanningInvalide(ValueError):
+    """Le fichier de planning n'a pas les colonnes attendues"""
+    def __init__(self, colonnes):
+        super().__init__(f"Format de fichier incorrect. Colonnes détectées: {len(colonnes)}")
+        self.colonnes = colonnes
+
+
+def ecrire_xlsx_flux(lignes, nom_feuille):
+    """Écrit les lignes dans un classeur openpyxl en écriture seule (mémoire bornée) et renvoie les octets"""
+    classeur = openpyxl.Workbook(write_only=True)
+    feuille = classeur.create_sheet(nom_feuille)
+    for ligne in lignes:
+        # Cellules vides plutôt que chaînes vides ou NaN, comme à l'affichage
+        feuille.append([None if (isinstance(valeur, str) and valeur == "") or valeur != valeur else valeur for valeur in ligne])
+    
+    sortie = BytesIO()
+    classeur.save(sortie)
+    return sortie.getvalue()
+
+
+@lru_cache(maxsize=4096)
+def analyser_horaire(texte):
+    """Plages d'une cellule de planning : tuple de (début, fin) en minutes depuis minuit du jour
+
+    Les codes d'absence et les textes sans horaire donnent un tuple vide. Une fin
+    plus tôt que le début (et avant midi) est le lendemain : 22h-6h donne (1320, 1800).
+    Chaque texte distinct n'est analysé qu'une fois (cache).
+    """
+    texte = texte.strip()
+    if texte.upper() in CODES_ABSENCE:
+        return ()
+    
+    plages = []
+    for heure_debut, minute_debut, heure_fin, minute_fin in MOTIF_PLAGE.findall(texte):
+        heure_debut, heure_fin = int(heure_debut), int(heure_fin)
+        debut = heure_debut * 60 + int(minute_debut or 0)
+        fin = heure_fin * 60 + int(minute_fin or 0)
+        # Ajuster les heures de fin après minuit
+        if fin < debut and heure_fin < 12:
+            fin += 24 * 60
+        plages.append((debut, fin))
+    return tuple(plages)
+
+
+def formater_heure(heure, minute):
+    """Heure affichée dans les listes : 7h, 7h30"""
+    return f"{heure}h{minute:02d}" if minute else f"{heure}h"
+
+
+def valeur_cellule(valeur):
+    """Valeur d'une cellule lue par openpyxl, convertie comme le fait pd.read_excel"""
+    if valeur is None or valeur == "" or (isinstance(valeur, str) and valeur in ERROR_CODES):
+        return None
+    if isinstance(valeur, float) and valeur.is_integer():
+        return int(valeur)
+    return valeur
+
+
+def lire_planning_en_flux(source, taille_bloc=TAILLE_BLOC_PLANNING):
+    """Lit le classeur de planning en une seule passe, en lecture seule (mémoire bornée)
+
+    Renvoie (cellules de la ligne des dates, blocs) : blocs est un générateur de
+    DataFrames d'au plus taille_bloc agents, aux colonnes COLONNES_PLANNING.
+    Comme pd.read_excel, les lignes vides en fin de feuille sont ignorées.
+    """
+    classeur = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    feuille = classeur.worksheets[0]
+    # Les dimensions enregistrées dans le fichier ne sont pas toujours justes
+    feuille.reset_dimensions()
+    lignes = feuille.iter_rows(values_only=True)
+    
+    entete = [next(lignes, ()) for _ in range(LIGNES_ENTETE_PLANNING + 1)]
+    ligne_dates = [valeur_cellule(valeur) for valeur in entete[1]]
+    ligne_dates += [None] * (len(COLONNES_PLANNING) - len(ligne_dates))
+    colonnes = [valeur_cellule(valeur) for valeur in entete[-1]]
+    while colonnes and colonnes[-1] is None:
+        colonnes.pop()
+    if len(colonnes) < len(COLONNES_PLANNING):
+        classeur.close()
+        raise FormatPlanningInvalide(colonnes)
+    
+    def bloc_agents(bloc):
+        # Cellules vides en NaN comme pd.read_excel (None laisserait une colonne vide en object)
+        return pd.DataFrame(bloc, columns=COLONNES_PLANNING).fillna(np.nan)
+    
+    def blocs():
+        try:
+            bloc = []
+            lignes_vides = 0
+            for ligne in lignes:
+                valeurs = tuple(valeur_cellule(valeur) for valeur in ligne[:len(COLONNES_PLANNING)])
+                if not any(valeur is not None for valeur in valeurs):
+                    # Gardée seulement si un agent suit (les lignes vides finales sont ignorées)
+                    lignes_vides += 1
+                    continue
+                bloc.extend([(None,) * len(COLONNES_PLANNING)] * lignes_vides)
+                lignes_vides = 0
+                bloc.append(valeurs + (None,) * (len(COLONNES_PLANNING) - len(valeurs)))
+                if len(bloc) >= taille_bloc:
+                    yield bloc_agents(bloc)
+                    bloc = []
+            if bloc:
+                yield bloc_agents(bloc)
+        finally:
+            classeur.close()
+    
+    return ligne_dates, blocs()
+
+
+def comparer_plannings(ancien, nouveau):
+    """Cellules agent × jour modifiées d'un planning à l'autre : [(rang, agent, jour, ancienne, nouvelle)]
+
+    Mêmes agents dans le même ordre : comparaison ligne à ligne. Sinon les agents
+    sont appariés par nom ; rang est la ligne de l'agent dans le nouveau planning
+    (None s'il n'y figure plus). Renvoie None si des noms d'agents sont alors en double.
+    """
+    if ancien['Salarie'].equals(nouveau['Salarie']):
+        # Mêmes agents dans le même ordre : comparaison directe, ligne à ligne
+        agents = nouveau['Salarie'].tolist()
+        rangs = np.arange(len(nouveau))
+        anciennes = ancien
+        nouvelles = nouveau
+    elif not (ancien['Salarie'].is_unique and nouveau['Salarie'].is_unique):
+        return None
+    else:
+        agents = pd.Index(ancien['Salarie']).union(pd.Index(nouveau['Salarie']), sort=False)
+        rangs = pd.Index(nouveau['Salarie']).get_indexer(agents)
+        anciennes = ancien.set_index('Salarie')[JOURS_SEMAINE].reindex(agents)
+        nouvelles = nouveau.set_index('Salarie')[JOURS_SEMAINE].reindex(agents)
+        agents = agents.tolist()
+    
+    # Une comparaison vectorisée par jour, par position ; deux cellules vides sont égales
+    modifications = []
+    for jour in JOURS_SEMAINE:
+        ancienne, nouvelle = anciennes[jour], nouvelles[jour]
+        if ancienne.dtype == nouvelle.dtype:
+            differentes = np.asarray(ancienne.array != nouvelle.array, dtype=bool)
+        else:
+            differentes = ancienne.to_numpy(object) != nouvelle.to_numpy(object)
+        modifiees = differentes & ~(ancienne.array.isna() & nouvelle.array.isna())
+        for ligne in np.flatnonzero(modifiees).tolist():
+            rang = int(rangs[ligne]) if rangs[ligne] >= 0 else None
+            modifications.append((rang, agents[ligne], jour, ancienne.iat[ligne], nouvelle.iat[ligne]))
+    return modifications
+
+
+class CacheLRU:
+    """Cache borné avec éviction du moins récemment utilisé et compteurs succès/échecs"""
+    def __init__(self, taille_max):
+        self.taille_max = taille_max
+        self.entrees = OrderedDict()
+        self.succes = 0
+        self.echecs = 0
+        self.verrou = threading.Lock()
+    
+    def obtenir(self, cle, calculer):
+        """Renvoie la valeur en cache pour cle, ou la calcule avec calculer() et la mémorise"""
+        with self.verrou:
+            if cle in self.entrees:
+                self.entrees.move_to_end(cle)
+                self.succes += 1
+                return self.entrees[cle]
+            self.echecs += 1
+        
+        # Calcul hors verrou : les autres sessions ne sont pas bloquées pendant l'analyse
+        valeur = calculer()
+        
+        with self.verrou:
+            self.entrees[cle] = valeur
+            self.entrees.move_to_end(cle)
+            while len(self.entrees) > self.taille_max:
+                self.entrees.popitem(last=False)
+        return valeur
+    
+    def statistiques(self):
+        with self.verrou:
+            return {'succes': self.succes, 'echecs': self.echecs, 'entrees': len(self.entrees), 'taille_max': self.taille_max}
+
+
+def indexer_annuaire(df_info):
+    """Construit l'index nom → informations de l'annuaire (un seul parcours)"""
+    index_agents = {}
+    if df_info is None or df_info.empty:
+        return index_agents
+    
+    nb_colonnes = len(df_info.columns)
+    colonnes = [df_info.iloc[:, i].tolist() for i in range(min(nb_colonnes, 5))]
+    
+    for position in range(len(df_info)):
+        nom_info = str(colonnes[0][position]).strip()
+        
+        # Comme l'ancien parcours ligne à ligne : la première occurrence gagne
+        if nom_info in index_agents:
+            continue
+        
+        a_voiture = "Non"
+        if nb_colonnes > 4:
+            voiture_info = str(colonnes[4][position]).strip().lower()
+            if voiture_info in VALEURS_VOITURE_OUI:
+                a_voiture = "Oui"
+        
+        index_agents[nom_info] = {
+            "adresse": str(colonnes[1][position]) if nb_colonnes > 1 else "Adresse non renseignée",
+            "tel": str(colonnes[2][position]) if nb_colonnes > 2 else "Tél non renseigné",
+            "societe": str(colonnes[3][position]) if nb_colonnes > 3 else "Société non renseignée",
+            "voiture": a_voiture
+        }
+    
+    return index_agents
+
+
+def lister_chauffeurs_voitures(df_info):
+    """Liste des chauffeurs (colonne 6) et de leur voiture (colonne 7) de l'annuaire"""
+    if df_info is None or df_info.empty or len(df_info.columns) <= 6:
+        return []
+    
+    chauffeurs_voitures = []
+    for chauffeur, voiture in zip(df_info.iloc[:, 5].tolist(), df_info.iloc[:, 6].tolist()):
+        chauffeur = str(chauffeur).strip() if pd.notna(chauffeur) else ""
+        voiture = str(voiture).strip() if pd.notna(voiture) else ""
+        
+        if chauffeur and chauffeur != "nan":
+            chauffeurs_voitures.append({
+                'chauffeur': chauffeur,
+                'voiture': voiture if voiture and voiture != "nan" else "Non renseigné"
+            })
+    
+    return chauffeurs_voitures
+
+
+def preparer_annuaire(chemin):
+    """Lit info.xlsx et précalcule l'index des agents et la liste des chauffeurs"""
+    df_info = pd.read_excel(chemin)
+    return df_info, indexer_annuaire(df_info), lister_chauffeurs_voitures(df_info)
+
+
+class CacheFichier:
+    """Résultat du chargement d'un fichier, recalculé seulement si sa date de modification ou sa taille change"""
+    def __init__(self):
+        self.entrees = {}
+        self.nb_chargements = 0
+        self.verrou = threading.Lock()
+    
+    def obtenir(self, chemin, charger):
+        """Renvoie charger(chemin), mémorisé tant que le fichier n'a pas changé"""
+        stat = os.stat(chemin)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        
+        # Verrou pendant le chargement : des sessions simultanées ne lisent le fichier qu'une fois
+        with self.verrou:
+            entree = self.entrees.get(chemin)
+            if entree is None or entree[0] != signature:
+                entree = (signature, charger(chemin))
+                self.entrees[chemin] = entree
+                self.nb_chargements += 1
+            return entree[1]
+    
+    def signature(self, chemin):
+        with self.verrou:
+            entree = self.entrees.get(chemin)
+            return entree[0] if entree else None
+
+
+def tronquer_texte(valeur, longueur_max):
+    """Texte d'une cellule PDF coupé à la largeur de sa colonne (pas de retour à la ligne)"""
+    texte = str(valeur)
+    return texte if len(texte) <= longueur_max else texte[:longueur_max - 1] + "…"
+
+
+def texte_pdf(valeur):
+    """Chaîne littérale PDF pour une police standard (encodage WinAnsi) ; caractères hors cp1252 remplacés par « ? »"""
+    return str(valeur).encode('cp1252', 'replace').decode('latin-1').translate(ECHAPPEMENTS_PDF)
+
+
+def dessiner_liste_pdf(sortie, titre, sous_titre, sections):
+    """Liste imprimable en PDF A4, dessinée directement sur le canevas
+
+    sections : [(titre de section, lignes)], chaque ligne donnant les textes des
+    COLONNES_PDF déjà tronqués. Les lignes ayant une hauteur fixe, chaque tableau
+    d'une page (en-tête répété, fond alterné, texte, grille) est écrit d'un bloc
+    en opérateurs PDF, sans les Table de platypus qui mesurent et stylent chaque
+    cellule.
+    """
+    from reportlab import rl_config
+    
+    # Flux de page compressés sans encodage ASCII85 : calculé en Python pur, il coûte autant que le dessin.
+    # Réglage global de ReportLab, lu à la création des pages et à l'enregistrement : rétabli ensuite
+    encodage_a85 = rl_config.useA85
+    rl_config.useA85 = 0
+    try:
+        dessiner_pages_pdf(sortie, titre, sous_titre, sections)
+    finally:
+        rl_config.useA85 = encodage_a85
+
+
+def dessiner_pages_pdf(sortie, titre, sous_titre, sections):
+    """Pages de dessiner_liste_pdf"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen.canvas import Canvas
+    
+    largeur_page, hauteur_page = A4
+    canevas = Canvas(sortie, pagesize=A4)
+    canevas.setTitle(titre)
+    
+    bords = [MARGE_PAGE_PDF]
+    for _, _, largeur, _ in COLONNES_PDF:
+        bords.append(bords[-1] + largeur)
+    gauche, droite = bords[0], bords[-1]
+    # Déplacement du texte d'une colonne à la suivante
+    decalages = [f"{largeur} 0 Td" for _, _, largeur, _ in COLONNES_PDF[:-1]]
+    entete = [texte_pdf(colonne[0]) for colonne in COLONNES_PDF]
+    
+    def texte_ligne(bas, textes):
+        """Textes d'une ligne, dans la police courante du canevas (choisie par setFont)"""
+        operations = [f"BT {gauche + MARGE_CELLULE_PDF} {bas + 4:.2f} Td ({textes[0]}) Tj"]
+        operations.extend(f"{decalage} ({texte}) Tj" for decalage, texte in zip(decalages, textes[1:]))
+        operations.append("ET")
+        return " ".join(operations)
+    
+    def dessiner_tableau(haut, lignes):
+        """En-tête puis lignes, de haut en bas à partir de haut"""
+        bas_tableau = haut - (len(lignes) + 1) * HAUTEUR_LIGNE_PDF
+        largeur = droite - gauche
+        
+        # Fonds et en-tête (gras, blanc)
+        operations = ["q", f"{COULEUR_ENTETE_PDF} rg {gauche} {haut - HAUTEUR_LIGNE_PDF:.2f} {largeur} {HAUTEUR_LIGNE_PDF} re f",
+                      COULEUR_LIGNE_ALTERNEE_PDF + " rg"]
+        operations.extend(f"{gauche} {haut - (rang + 2) * HAUTEUR_LIGNE_PDF:.2f} {largeur} {HAUTEUR_LIGNE_PDF} re"
+                          for rang in range(1, len(lignes), 2))
+        operations.append("f 1 g")
+        operations.append(texte_ligne(haut - HAUTEUR_LIGNE_PDF, entete))
+        operations.append("Q")
+        canevas.setFont('Helvetica-Bold', TAILLE_POLICE_PDF)
+        canevas.addLiteral("\n".join(operations))
+        
+        # Lignes (noir) puis grille
+        operations = ["q 0 g"]
+        operations.extend(texte_ligne(haut - (rang + 2) * HAUTEUR_LIGNE_PDF, [texte_pdf(texte) for texte in ligne])
+                          for rang, ligne in enumerate(lignes))
+        operations.append("0.25 w 0.5 G")
+        operations.extend(f"{gauche} {haut - rang * HAUTEUR_LIGNE_PDF:.2f} m {droite} {haut - rang * HAUTEUR_LIGNE_PDF:.2f} l"
+                          for rang in range(len(lignes) + 2))
+        operations.extend(f"{x} {haut:.2f} m {x} {bas_tableau:.2f} l" for x in bords)
+        operations.append("S Q")
+        canevas.setFont('Helvetica', TAILLE_POLICE_PDF)
+        canevas.addLiteral("\n".join(operations))
+    
+    haut_page = hauteur_page - MARGE_PAGE_PDF
+    canevas.setFont('Helvetica-Bold', 16)
+    canevas.drawCentredString(largeur_page / 2, haut_page - 16, titre)
+    canevas.setFont('Helvetica', 9)
+    canevas.setFillGray(0.5)
+    canevas.drawString(gauche, haut_page - 36, sous_titre)
+    canevas.setFillGray(0)
+    haut = haut_page - 48
+    
+    for titre_section, lignes in sections:
+        # Titre de section avec au moins l'en-tête et une ligne sur la même page
+        if haut - 20 - 2 * HAUTEUR_LIGNE_PDF < MARGE_PAGE_PDF:
+            canevas.showPage()
+            haut = haut_page
+        canevas.setFont('Helvetica-Bold', 12)
+        canevas.drawString(gauche, haut - 14, titre_section)
+        haut -= 20
+        
+        debut = 0
+        while debut < len(lignes):
+            if haut - 2 * HAUTEUR_LIGNE_PDF < MARGE_PAGE_PDF:
+                canevas.showPage()
+                haut = haut_page
+            nb_lignes = min(len(lignes) - debut, int((haut - MARGE_PAGE_PDF) // HAUTEUR_LIGNE_PDF) - 1)
+            dessiner_tableau(haut, lignes[debut:debut + nb_lignes])
+            haut -= (nb_lignes + 1) * HAUTEUR_LIGNE_PDF
+            debut += nb_lignes
+        haut -= 6
+    
+    canevas.save()
+
+
+class MoteurTransport:
+    """Cœur de l'application : planning, annuaire, affectations, statistiques et exports
+    
+    Aucune dépendance à Streamlit : les résultats sont renvoyés et les messages
+    destinés à l'utilisateur sont accumulés dans self.diagnostics. Les caches,
+    le pool de travaux et la mémoïsation sont injectables (partagés entre
+    sessions par l'interface, propres à l'instance sinon), comme les mesures
+    de performance (désactivées par défaut).
+    """
+    def __init__(self, fichier_sauvegarde="affectations_permanentes.arrow", type_stockage=None, fichier_infos=FICHIER_INFOS,
+                 cache_plannings=None, cache_annuaire=None, travaux=None, memo=None, mesures=None):
+        self.df = None
+        self.df_info = pd.DataFrame()
+        self.index_agents = {}
+        self.chauffeurs_voitures = []
+        self.dates_par_jour = {}
+        self.empreinte_planning = None
+        self.signature_annuaire = None
+        self.liste_ramassage_actuelle = []
+        self.liste_depart_actuelle = []
+        self.parametres_traitement = None
+        # Affectations dont l'agent n'a plus l'horaire dans le planning révisé (identifiants)
+        self.affectations_perimees = []
+        
+        # Mode de traitement du planning : "colonnes" (vectorisé) ou "lignes"
+        self.mode_traitement = "colonnes"
+        
+        # Fichier de sauvegarde permanent
+        self.fichier_sauvegarde = fichier_sauvegarde
+        
+        # Stockage des affectations : "journal" (xlsx + journal) ou "sqlite"
+        self.type_stockage = type_stockage or os.environ.get("TRANSPORT_STOCKAGE", "journal")
+        self.fichier_infos = fichier_infos
+        
+        # Prix par défaut
+        self.prix_course_chauffeur = 10  # Prix par défaut pour les chauffeurs normaux
+        self.prix_course_taxi = 15       # Prix par défaut pour les taxis
+        
+        # Affectations en mémoire tant que initialiser_donnees() n'a pas ouvert de stockage
+        self.stockage = StockageMemoire()
+        self.df_chauffeurs = self.stockage.df
+        
+        self.cache_plannings = cache_plannings if cache_plannings is not None else CacheLRU(taille_max=8)
+        self.cache_annuaire = cache_annuaire if cache_annuaire is not None else CacheFichier()
+        self.travaux = travaux if travaux is not None else GestionnaireTravaux()
+        self.memo = memo if memo is not None else {}
+        self.mesures = mesures if mesures is not None else Mesures()
+        
+        # Messages pour l'utilisateur : [(niveau, message), ...]
+        self.diagnostics = []
+    
+    def ajouter_diagnostic(self, niveau, message):
+        """Retient un message ; niveau parmi NIVEAUX_DIAGNOSTIC"""
+        self.diagnostics.append((niveau, message))
+    
+    def calcul_memorise(self, nom, cle, calculer):
+        """Résultat de calculer() gardé tant que sa clé (ses entrées) ne change pas"""
+        entree = self.memo.get(nom)
+        if entree is None or entree[0] != cle:
+            entree = (cle, calculer())
+            self.memo[nom] = entree
+        return entree[1]
+    
+    def etat_detache(self, df_chauffeurs=None):
+        """Données utilisées par les rapports, transmissibles à un processus de travail (sans caches ni fichiers)"""
+        return {
+            'df_chauffeurs': self.df_chauffeurs if df_chauffeurs is None else df_chauffeurs,
+            'dates_par_jour': self.dates_par_jour,
+            'liste_ramassage_actuelle': self.liste_ramassage_actuelle,
+            'liste_depart_actuelle': self.liste_depart_actuelle,
+            'parametres_traitement': self.parametres_traitement,
+            'empreinte_planning': self.empreinte_planning,
+            'signature_annuaire': self.signature_annuaire,
+            'type_stockage': self.type_stockage,
+            'prix_course_chauffeur': self.prix_course_chauffeur,
+            'prix_course_taxi': self.prix_course_taxi
+        }
+    
+    @classmethod
+    def depuis_etat_detache(cls, etat):
+        """Instance construite à partir de etat_detache() ; stockage en mémoire seulement"""
+        gestion = cls()
+        for nom, valeur in etat.items():
+            setattr(gestion, nom, valeur)
+        gestion.stockage.df = gestion.df_chauffeurs
+        return gestion
+    
+    def initialiser_donnees(self, stockage=None):
+        """Initialise ou charge les données depuis le fichier de sauvegarde (ou le stockage fourni)"""
+        self.stockage = stockage if stockage is not None else ouvrir_stockage(self.type_stockage, self.fichier_sauvegarde)
+        self.df_chauffeurs = self.stockage.df
+        
+        if self.stockage.erreur_chargement is not None:
+            self.ajouter_diagnostic('avertissement', "Erreur chargement sauvegarde, nouvelle session créée")
+        elif self.stockage.charge_depuis_fichier:
+            self.ajouter_diagnostic('succes', "Affectations chargées depuis la sauvegarde")
+    
+    def sauvegarder_donnees_permanentes(self):
+        """Sauvegarde complète (instantané) dans le fichier permanent"""
+        try:
+            with self.mesures.span("sauvegarder_donnees_permanentes"):
+                self.df_chauffeurs = self.stockage.compacter()
+            self.mesures.compter("lignes_sauvegardees", len(self.df_chauffeurs))
+            return True
+        except Exception as e:
+            self.ajouter_diagnostic('erreur', f"Erreur sauvegarde permanente: {e}")
+            return False
+    
+    def enregistrer(self, operation, *args):
+        """Applique une modification via le stockage (sans réécrire tout l'historique)"""
+        try:
+            with self.mesures.span("enregistrer"):
+                self.df_chauffeurs = operation(*args)
+            return True
+        except Exception as e:
+            self.ajouter_diagnostic('erreur', f"Erreur sauvegarde permanente: {e}")
+            return False
+    
+    def charger_infos_agents(self):
+        """Charge le fichier info.xlsx avec les adresses et téléphones"""
+        def lire_annuaire(chemin):
+            with self.mesures.span("read_excel:annuaire"):
+                return preparer_annuaire(chemin)
+        
+        try:
+            if os.path.exists(self.fichier_infos):
+                # Lu une seule fois par cache, relu seulement si le fichier change
+                self.df_info, self.index_agents, self.chauffeurs_voitures = self.cache_annuaire.obtenir(self.fichier_infos, lire_annuaire)
+                self.signature_annuaire = self.cache_annuaire.signature(self.fichier_infos)
+                self.ajouter_diagnostic('succes', f"Fichier {os.path.basename(self.fichier_infos)} chargé")
+                return
+            else:
+                self.df_info = pd.DataFrame()
+                self.ajouter_diagnostic('avertissement', f"Fichier {os.path.basename(self.fichier_infos)} non trouvé")
+        except Exception as e:
+            self.df_info = pd.DataFrame()
+            self.ajouter_diagnostic('erreur', f"Erreur chargement {os.path.basename(self.fichier_infos)}: {e}")
+        
+        self.indexer_infos_agents()
+    
+    def indexer_infos_agents(self):
+        """Reconstruit l'index des agents et la liste des chauffeurs à partir de self.df_info"""
+        self.index_agents = indexer_annuaire(self.df_info)
+        self.chauffeurs_voitures = lister_chauffeurs_voitures(self.df_info)
+    
+    def sauvegarder_affectations(self):
+        """Sauvegarde les affectations dans un fichier Excel pour export"""
+        if self.df_chauffeurs.empty:
+            return None, None
+        
+        # Créer un nom de fichier avec la date du mois
+        nom_fichier = f"affectations_chauffeurs_{datetime.now().strftime('%Y_%m')}.xlsx"
+        
+        # Sauvegarder dans un buffer
+        output = BytesIO()
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            affectations_texte(self.df_chauffeurs).to_excel(writer, sheet_name='Affectations', index=False)
+        
+        return output.getvalue(), nom_fichier
+    
+    def charger_affectations(self, uploaded_file):
+        """Charge les affectations depuis un fichier Excel"""
+        try:
+            with self.mesures.span("read_excel:affectations"):
+                df_charge = pd.read_excel(uploaded_file)
+            # Vérifier que le fichier a les bonnes colonnes
+            colonnes_requises = ['Chauffeur', 'Heure', 'Agent', 'Adresse', 'Telephone', 'Societe', 'Vehicule', 'Type_Transport', 'Jour', 'Date_Reelle']
+            
+            if all(col in df_charge.columns for col in colonnes_requises):
+                # Sauvegarder en permanent (nouvel instantané complet)
+                return self.enregistrer(self.stockage.remplacer, df_charge)
+            else:
+                self.ajouter_diagnostic('erreur', "Le fichier ne contient pas les colonnes requises")
+                return False
+                
+        except Exception as e:
+            self.ajouter_diagnostic('erreur', f"Erreur lors du chargement du fichier: {e}")
+            return False
+    
+    def get_info_agent(self, nom_agent):
+        """Récupère les informations d'un agent"""
+        if not self.index_agents:
+            return dict(INFOS_AGENT_PAR_DEFAUT)
+        
+        try:
+            return dict(self.index_agents.get(nom_agent.strip(), INFOS_AGENT_PAR_DEFAUT))
+            
+        except Exception as e:
+            return dict(INFOS_AGENT_PAR_DEFAUT)
+    
+    def get_liste_chauffeurs_voitures(self):
+        """Récupère la liste des chauffeurs depuis info.xlsx"""
+        return list(self.chauffeurs_voitures)
+    
+    def charger_planning(self, fichier):
+        """Charge le planning (agents + dates) ; un contenu déjà analysé n'est pas relu"""
+        contenu = fichier.getvalue()
+        empreinte = hashlib.sha256(contenu).hexdigest()
+        
+        with self.mesures.span("charger_planning"):
+            df, dates_par_jour = self.cache_plannings.obtenir(empreinte, lambda: self.analyser_planning(contenu))
+        
+        # Le DataFrame en cache est partagé : il n'est jamais modifié sur place
+        self.df = df
+        self.dates_par_jour = dict(dates_par_jour)
+        self.empreinte_planning = empreinte
+    
+    def analyser_planning(self, contenu):
+        """Lit le classeur de planning : agents (après les 2 lignes d'en-tête) et dates des jours"""
+        # Une seule lecture du classeur : ligne des dates, puis agents par blocs
+        with self.mesures.span("lire_planning"):
+            ligne_dates, blocs = lire_planning_en_flux(BytesIO(contenu))
+            morceaux = []
+            for bloc in blocs:
+                morceaux.append(bloc)
+                self.mesures.compter("blocs_planning")
+        
+        if morceaux:
+            df = pd.concat(morceaux, ignore_index=True).infer_objects()
+        else:
+            df = pd.DataFrame(columns=COLONNES_PLANNING)
+        return df, self.extraire_dates_des_entetes(ligne_dates)
+    
+    def extraire_dates_des_entetes(self, ligne_dates):
+        """Extrait les dates depuis les cellules de la 2ème ligne du fichier Excel"""
+        try:
+            dates_par_jour = {}
+            
+            # Mapping des positions des colonnes vers les jours
+            positions_jours = {
+                1: 'Lundi', 2: 'Mardi', 3: 'Mercredi', 4: 'Jeudi', 
+                5: 'Vendredi', 6: 'Samedi', 7: 'Dimanche'
+            }
+            
+            # Parcourir les colonnes de jours
+            for col_index, jour_nom in positions_jours.items():
+                if col_index < len(ligne_dates):
+                    # Cellule de la DEUXIÈME ligne qui contient la date du jour
+                    cellule = ligne_dates[col_index]
+                    nom_colonne = str(cellule) if pd.notna(cellule) else ""
+                    
+                    # Chercher un motif date (jj/mm ou jj/mm/aaaa)
+                    match = re.search(r'(\d{1,2})[/-](\d{1,2})', nom_colonne)
+                    if match:
+                        jour = match.group(1)
+                        mois = match.group(2)
+                        
+                        # Déterminer l'année
+                        annee_courante = datetime.now().year
+                        mois_actuel = datetime.now().month
+                        
+                        if int(mois) < mois_actuel:
+                            annee_courante += 1
+                        
+                        date_trouvee = f"{jour.zfill(2)}/{mois.zfill(2)}/{annee_courante}"
+                        dates_par_jour[jour_nom] = date_trouvee
+                    else:
+                        # Date par défaut si non détectée
+                        date_par_defaut = self.calculer_date_par_defaut(jour_nom)
+                        dates_par_jour[jour_nom] = date_par_defaut
+            
+            return dates_par_jour
+            
+        except Exception as e:
+            return self.generer_dates_par_defaut()
+    
+    def calculer_date_par_defaut(self, jour_nom=None):
+        aujourd_hui = datetime.now()
+        jours_semaine = {
+            'Lundi': 0, 'Mardi': 1, 'Mercredi': 2, 'Jeudi': 3, 
+            'Vendredi': 4, 'Samedi': 5, 'Dimanche': 6
+        }
+        
+        if jour_nom and jour_nom in jours_semaine:
+            jour_cible = jours_semaine[jour_nom]
+            jour_actuel = aujourd_hui.weekday()
+            
+            if jour_cible >= jour_actuel:
+                decalage = jour_cible - jour_actuel
+            else:
+                decalage = 7 - (jour_actuel - jour_cible)
+            
+            date_calculee = aujourd_hui + timedelta(days=decalage)
+        else:
+            date_calculee = aujourd_hui
+        
+        return date_calculee.strftime("%d/%m/%Y")
+    
+    def generer_dates_par_defaut(self):
+        aujourd_hui = datetime.now()
+        dates_par_defaut = {}
+        jours_ordre = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+        
+        jour_actuel = aujourd_hui.weekday()
+        jours_vers_lundi = (0 - jour_actuel) % 7
+        date_debut = aujourd_hui + timedelta(days=jours_vers_lundi)
+        
+        for i, jour in enumerate(jours_ordre):
+            date_jour = date_debut + timedelta(days=i)
+            dates_par_defaut[jour] = date_jour.strftime("%d/%m/%Y")
+        
+        return dates_par_defaut
+    
+    def get_date_du_jour(self, jour_nom):
+        return self.dates_par_jour.get(jour_nom, self.calculer_date_par_defaut(jour_nom))
+    
+    def ajuster_heure_ete(self, heure, heure_ete_active):
+        return heure - 1 if heure_ete_active else heure
+
+    def extraire_plages(self, planning):
+        """Plages (début, fin) en minutes d'une cellule de planning, vide si absence ou cellule vide"""
+        if pd.isna(planning):
+            return ()
+        return analyser_horaire(str(planning))
+    
+    def traiter_donnees(self, heure_ete_active, jour_selectionne, heures_ramassage_selectionnees, heures_depart_selectionnees):
+        """Traite les données du fichier Excel - VERSION CORRIGÉE"""
+        if self.df is None:
+            return
+        
+        # Filtres des listes actuelles, repris par les listes imprimables
+        self.parametres_traitement = {
+            'heure_ete_active': heure_ete_active,
+            'jour_selectionne': jour_selectionne,
+            'heures_ramassage': list(heures_ramassage_selectionnees),
+            'heures_depart': list(heures_depart_selectionnees)
+        }
+        
+        with self.mesures.span("traiter_donnees"):
+            if self.mode_traitement == "colonnes":
+                self.traiter_donnees_colonnes(heure_ete_active, jour_selectionne, heures_ramassage_selectionnees, heures_depart_selectionnees)
+            else:
+                self.traiter_donnees_lignes(heure_ete_active, jour_selectionne, heures_ramassage_selectionnees, heures_depart_selectionnees)
+        
+        self.mesures.compter("lignes_planning", len(self.df))
+        self.mesures.compter("recherches_annuaire", len(self.df))
+        self.mesures.compter("agents_listes", len(self.liste_ramassage_actuelle) + len(self.liste_depart_actuelle))
+    
+    def preparer_listes(self, heure_ete_active, jour_selectionne, heures_ramassage_selectionnees, heures_depart_selectionnees):
+        """traiter_donnees mémorisé : relancé seulement si le planning, l'annuaire ou les filtres changent
+        
+        Pour un planning révisé (mêmes agents, quelques horaires modifiés), seules les
+        cellules modifiées sont recalculées dans les listes du planning précédent.
+        """
+        filtres = (self.signature_annuaire, self.mode_traitement, heure_ete_active, jour_selectionne,
+                   tuple(heures_ramassage_selectionnees), tuple(heures_depart_selectionnees))
+        revision = self.comparer_au_planning_precedent(heure_ete_active)
+        precedent = self.memo.get('listes')
+        
+        def calculer():
+            if revision is not None and revision[2] and precedent is not None and precedent[0] == (revision[0],) + filtres:
+                listes_precedentes = precedent[1]
+                with self.mesures.span("mettre_a_jour_listes"):
+                    self.liste_ramassage_actuelle, self.liste_depart_actuelle = self.mettre_a_jour_listes(
+                        listes_precedentes, revision[1], heure_ete_active, jour_selectionne,
+                        heures_ramassage_selectionnees, heures_depart_selectionnees)
+                self.parametres_traitement = listes_precedentes[2]
+            else:
+                self.traiter_donnees(heure_ete_active, jour_selectionne, heures_ramassage_selectionnees, heures_depart_selectionnees)
+            return self.liste_ramassage_actuelle, self.liste_depart_actuelle, self.parametres_traitement
+        
+        cle = (self.empreinte_planning,) + filtres
+        self.liste_ramassage_actuelle, self.liste_depart_actuelle, self.parametres_traitement = self.calcul_memorise('listes', cle, calculer)
+        
+        # Signalement gardé tant que le planning révisé reste chargé
+        perimees = self.memo.get('affectations_perimees')
+        if perimees is not None and perimees[0] == self.empreinte_planning:
+            self.affectations_perimees = [identifiant for identifiant in perimees[1] if identifiant in self.df_chauffeurs.index]
+    
+    def comparer_au_planning_precedent(self, heure_ete_active):
+        """Modifications depuis le planning précédent de la session : (empreinte précédente, modifications, listes réutilisables)
+        
+        None pour le premier planning, le même planning, une autre semaine (autres dates)
+        ou des agents impossibles à apparier. Les listes précédentes ne sont réutilisables
+        que pour les mêmes agents, dans le même ordre et sans homonymes. Les affectations
+        que les modifications rendent caduques sont repérées au passage.
+        """
+        precedent = self.memo.get('planning')
+        self.memo['planning'] = (self.empreinte_planning, self.df, self.dates_par_jour)
+        if precedent is None or precedent[0] == self.empreinte_planning or precedent[2] != self.dates_par_jour:
+            return None
+        
+        ancienne_empreinte, ancien_df, _ = precedent
+        with self.mesures.span("comparer_plannings"):
+            modifications = comparer_plannings(ancien_df, self.df)
+        if modifications is None:
+            return None
+        self.mesures.compter("cellules_modifiees", len(modifications))
+        
+        perimees = self.reperer_affectations_perimees(modifications, heure_ete_active)
+        self.memo['affectations_perimees'] = (self.empreinte_planning, perimees)
+        if perimees:
+            self.ajouter_diagnostic('avertissement', f"{len(perimees)} affectation(s) ne correspondent plus au planning révisé")
+        listes_reutilisables = ancien_df['Salarie'].equals(self.df['Salarie']) and self.df['Salarie'].is_unique
+        return ancienne_empreinte, modifications, listes_reutilisables
+    
+    def reperer_affectations_perimees(self, modifications, heure_ete_active):
+        """Identifiants des affectations de la semaine dont l'agent n'a plus l'horaire (cellule modifiée)"""
+        if self.df_chauffeurs.empty or not modifications:
+            return []
+        
+        nouveaux_horaires = {(agent, jour): nouvelle for _, agent, jour, _, nouvelle in modifications}
+        candidates = self.df_chauffeurs[self.df_chauffeurs['Agent'].isin({agent for agent, _ in nouveaux_horaires})]
+        decalage = 1 if heure_ete_active else 0
+        
+        perimees = []
+        for identifiant, agent, jour, heure, type_transport, date_reelle in zip(
+                candidates.index, candidates['Agent'], candidates['Jour'], candidates['Heure'],
+                candidates['Type_Transport'], candidates['Date_Reelle']):
+            if (agent, jour) not in nouveaux_horaires or date_reelle != lire_date_reelle(self.get_date_du_jour(jour)):
+                continue
+            heure = heure_du_creneau(heure)
+            if heure is None:
+                continue
+            
+            # Heures proposées par le nouvel horaire, comme dans les listes (départ ramené sur 24h)
+            plages = self.extraire_plages(nouveaux_horaires[(agent, jour)])
+            if type_transport == "Ramassage":
+                heures = {debut // 60 - decalage for debut, _ in plages}
+            else:
+                heures = {(fin // 60 - decalage) % 24 for _, fin in plages}
+            if heure not in heures:
+                perimees.append(identifiant)
+        return perimees
+    
+    def mettre_a_jour_listes(self, listes, modifications, heure_ete_active, jour_selectionne,
+                             heures_ramassage_selectionnees, heures_depart_selectionnees):
+        """Listes du planning précédent corrigées des seules cellules modifiées (mêmes agents, même ordre)
+        
+        Les entrées de l'ancienne cellule sont retirées et celles de la nouvelle insérées
+        à leur place dans l'ordre (jour, heure, rang de l'agent) de traiter_donnees.
+        """
+        ramassage = list(listes[0])
+        depart = list(listes[1])
+        rangs = {}
+        
+        def cle_tri(entree):
+            if not rangs:
+                rangs.update(zip(self.df['Salarie'].tolist(), range(len(self.df))))
+            minute = entree['Heure_affichage'].partition('h')[2]
+            return JOURS_SEMAINE.index(entree['Jour']), entree['Heure'] * 60 + int(minute or 0), rangs[entree['Agent']]
+        
+        for _, agent, jour, ancienne, nouvelle in modifications:
+            if jour_selectionne != 'Tous' and jour != jour_selectionne:
+                continue
+            info_agent = self.get_info_agent(agent)
+            if info_agent['voiture'] == "Oui":
+                continue
+            
+            anciennes_entrees = self.entrees_cellule(agent, info_agent, jour, ancienne, heure_ete_active,
+                                                     heures_ramassage_selectionnees, heures_depart_selectionnees)
+            nouvelles_entrees = self.entrees_cellule(agent, info_agent, jour, nouvelle, heure_ete_active,
+                                                     heures_ramassage_selectionnees, heures_depart_selectionnees)
+            for liste, a_retirer, a_ajouter in zip((ramassage, depart), anciennes_entrees, nouvelles_entrees):
+                for entree in a_retirer:
+                    position = bisect_left(liste, cle_tri(entree), key=cle_tri)
+                    if position < len(liste) and liste[position] == entree:
+                        del liste[position]
+                for entree in a_ajouter:
+                    insort(liste, entree, key=cle_tri)
+        
+        self.mesures.compter("agents_listes", len(ramassage) + len(depart))
+        return ramassage, depart
+    
+    def traiter_donnees_colonnes(self, heure_ete_active, jour_selectionne, heures_ramassage_selectionnees, heures_depart_selectionnees):
+        """Traitement vectorisé : toutes les cellules agent × jour sont analysées en une passe"""
+        self.liste_ramassage_actuelle = []
+        self.liste_depart_actuelle = []
+        
+        jours = JOURS_SEMAINE if jour_selectionne == 'Tous' else [jour_selectionne]
+        
+        # Une recherche dans l'annuaire par agent, puis exclusion des agents véhiculés
+        noms_agents = self.df['Salarie'].tolist()
+        infos_agents = [self.get_info_agent(nom_agent) for nom_agent in noms_agents]
+        sans_voiture = np.array([info['voiture'] != "Oui" for info in infos_agents], dtype=bool)
+        
+        # Format long : une ligne par cellule (agent, jour)
+        df_jours = self.df[jours].copy()
+        df_jours['_rang'] = np.arange(len(self.df))
+        long = df_jours[sans_voiture].melt(id_vars='_rang', var_name='Jour', value_name='Planning')
+        long = long[long['Planning'].notna()]
+        
+        # Horaires encodés en dictionnaire : chaque texte distinct n'est analysé qu'une fois
+        codes, textes = pd.factorize(long['Planning'].astype(str))
+        plages_textes = [analyser_horaire(texte) for texte in textes]
+        nb_plages = np.array([len(plages) for plages in plages_textes], dtype='int64')
+        
+        # Une ligne par (cellule, plage) : un horaire coupé donne plusieurs ramassages / départs
+        repetitions = nb_plages[codes]
+        if not repetitions.any():
+            return
+        cellules = np.repeat(np.arange(len(codes)), repetitions)
+        rang_plage = np.arange(len(cellules)) - np.repeat(np.cumsum(repetitions) - repetitions, repetitions)
+        premiere_plage = np.cumsum(nb_plages) - nb_plages
+        plages = np.array([plage for plages in plages_textes for plage in plages], dtype='int64').reshape(-1, 2)
+        plages = plages[premiere_plage[codes[cellules]] + rang_plage]
+        
+        rangs = long['_rang'].to_numpy()[cellules]
+        jours_long = long['Jour'].to_numpy()[cellules]
+        debut = plages[:, 0]
+        fin = plages[:, 1]
+        
+        # Appliquer ajustement heure d'été si nécessaire
+        if heure_ete_active:
+            debut = debut - 60
+            fin = fin - 60
+        
+        heure_debut, minute_debut = np.divmod(debut, 60)
+        heure_fin, minute_fin = np.divmod(fin, 60)
+        heure_fin_comparaison = np.where(heure_fin >= 24, heure_fin - 24, heure_fin)
+        ordre_jours = pd.Categorical(jours_long, categories=JOURS_SEMAINE).codes
+        dates_jours = {jour: self.get_date_du_jour(jour) for jour in jours}
+        
+        def construire_liste(masque, minutes_liste, heures_liste, heures_affichees, minutes_affichees):
+            # Même ordre que le tri (jour, heure, heure affichée) stable de la version ligne à ligne
+            positions = np.flatnonzero(masque)
+            positions = positions[np.lexsort((rangs[positions], minutes_liste[positions], ordre_jours[positions]))]
+            
+            liste = []
+            for rang, jour_nom, heure, heure_affichee, minute in zip(
+                    rangs[positions].tolist(), jours_long[positions].tolist(), heures_liste[positions].tolist(),
+                    heures_affichees[positions].tolist(), minutes_affichees[positions].tolist()):
+                info_agent = infos_agents[rang]
+                liste.append({
+                    'Agent': noms_agents[rang],
+                    'Jour': jour_nom,
+                    'Heure': heure,
+                    'Heure_affichage': formater_heure(heure_affichee, minute),
+                    'Adresse': info_agent['adresse'],
+                    'Telephone': info_agent['tel'],
+                    'Societe': info_agent['societe'],
+                    'Voiture': info_agent['voiture'],
+                    'Date_Reelle': dates_jours[jour_nom]
+                })
+            return liste
+        
+        # RAMASSAGE - heure de début ; DÉPART - heure de fin ramenée sur 24h
+        masque_ramassage = np.isin(heure_debut, list(heures_ramassage_selectionnees))
+        masque_depart = np.isin(heure_fin_comparaison, list(heures_depart_selectionnees))
+        
+        self.liste_ramassage_actuelle = construire_liste(masque_ramassage, debut, heure_debut, heure_debut, minute_debut)
+        self.liste_depart_actuelle = construire_liste(masque_depart, fin, heure_fin, heure_fin_comparaison, minute_fin)
+    
+    def traiter_donnees_lignes(self, heure_ete_active, jour_selectionne, heures_ramassage_selectionnees, heures_depart_selectionnees):
+        """Traitement ligne à ligne (ancienne version, conservée comme référence)"""
+        self.liste_ramassage_actuelle = []
+        self.liste_depart_actuelle = []
+        
+        jours_mapping = {
+            'Lundi': 'Lundi', 'Mardi': 'Mardi', 'Mercredi': 'Mercredi', 
+            'Jeudi': 'Jeudi', 'Vendredi': 'Vendredi', 'Samedi': 'Samedi', 'Dimanche': 'Dimanche'
+        }
+        
+        for _, agent in self.df.iterrows():
+            nom_agent = agent['Salarie']
+            info_agent = self.get_info_agent(nom_agent)
+            
+            # DEBUG: Vérifier les agents exclus
+            if info_agent['voiture'] == "Oui":
+                continue
+            
+            jours_a_verifier = []
+            if jour_selectionne == 'Tous':
+                for jour_col, jour_nom in jours_mapping.items():
+                    jours_a_verifier.append((jour_col, jour_nom))
+            else:
+                jours_a_verifier.append((jour_selectionne, jour_selectionne))
+            
+            for jour_col, jour_nom in jours_a_verifier:
+                ramassage, depart = self.entrees_cellule(nom_agent, info_agent, jour_nom, agent[jour_col], heure_ete_active,
+                                                         heures_ramassage_selectionnees, heures_depart_selectionnees)
+                self.liste_ramassage_actuelle.extend(ramassage)
+                self.liste_depart_actuelle.extend(depart)
+        
+        # Trier par jour (dans l'ordre de la semaine) puis par heure
+        ordre_jours = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+        self.liste_ramassage_actuelle.sort(key=lambda x: (ordre_jours.index(x['Jour']), x['Heure'], x['Heure_affichage']))
+        self.liste_depart_actuelle.sort(key=lambda x: (ordre_jours.index(x['Jour']), x['Heure'], x['Heure_affichage']))
+    
+    def entrees_cellule(self, nom_agent, info_agent, jour_nom, planning, heure_ete_active,
+                        heures_ramassage_selectionnees, heures_depart_selectionnees):
+        """Entrées (ramassage, départ) des listes pour une cellule agent × jour du planning"""
+        ramassage = []
+        depart = []
+        
+        # Un horaire coupé a plusieurs plages : un ramassage et un départ par plage
+        for debut, fin in self.extraire_plages(planning):
+            heure_debut, minute_debut = divmod(debut, 60)
+            heure_fin, minute_fin = divmod(fin, 60)
+            
+            # Appliquer ajustement heure d'été si nécessaire
+            if heure_ete_active:
+                heure_debut_ajustee = self.ajuster_heure_ete(heure_debut, heure_ete_active)
+                heure_fin_ajustee = self.ajuster_heure_ete(heure_fin, heure_ete_active)
+            else:
+                heure_debut_ajustee = heure_debut
+                heure_fin_ajustee = heure_fin
+            
+            # RAMASSAGE - vérifier l'heure de début
+            if heure_debut_ajustee in heures_ramassage_selectionnees:
+                agent_data = {
+                    'Agent': nom_agent,
+                    'Jour': jour_nom,
+                    'Heure': heure_debut_ajustee,
+                    'Heure_affichage': formater_heure(heure_debut_ajustee, minute_debut),
+                    'Adresse': info_agent['adresse'],
+                    'Telephone': info_agent['tel'],
+                    'Societe': info_agent['societe'],
+                    'Voiture': info_agent['voiture'],
+                    'Date_Reelle': self.get_date_du_jour(jour_nom)
+                }
+                ramassage.append(agent_data)
+            
+            # DÉPART - vérifier l'heure de fin
+            heure_fin_comparaison = heure_fin_ajustee
+            if heure_fin_comparaison >= 24:
+                heure_fin_comparaison = heure_fin_comparaison - 24
+            
+            if heure_fin_comparaison in heures_depart_selectionnees:
+                heure_fin_affichee = heure_fin_ajustee
+                if heure_fin_ajustee >= 24:
+                    heure_fin_affichee = heure_fin_ajustee - 24
+                
+                agent_data = {
+                    'Agent': nom_agent,
+                    'Jour': jour_nom,
+                    'Heure': heure_fin_ajustee,
+                    'Heure_affichage': formater_heure(heure_fin_affichee, minute_fin),
+                    'Adresse': info_agent['adresse'],
+                    'Telephone': info_agent['tel'],
+                    'Societe': info_agent['societe'],
+                    'Voiture': info_agent['voiture'],
+                    'Date_Reelle': self.get_date_du_jour(jour_nom)
+                }
+                depart.append(agent_data)
+        
+        return ramassage, depart
+    
+    def get_prix_course(self, chauffeur, type_transport):
+        """Retourne le prix d'une course selon le type de chauffeur"""
+        if "taxi" in str(chauffeur).lower():
+            return self.prix_course_taxi
+        else:
+            return self.prix_course_chauffeur
+    
+    def construire_affectations(self, chauffeur, heure, agents_selectionnes, type_transport, jour, prix_specifique=None):
+        """Construit les lignes d'affectation (une par agent) avec la date réelle et le prix"""
+        date_reelle = self.get_date_du_jour(jour)
+        date_ajout = datetime.now().strftime("%d/%m/%Y %H:%M")
+        
+        # Déterminer le prix
+        if prix_specifique is not None:
+            prix_course = prix_specifique
+        else:
+            prix_course = self.get_prix_course(chauffeur, type_transport)
+        
+        nouvelles_affectations = []
+        for agent_nom in agents_selectionnes:
+            info_agent = self.get_info_agent(agent_nom)
+            
+            nouvelles_affectations.append({
+                'Chauffeur': chauffeur,
+                'Heure': heure,
+                'Agent': agent_nom,
+                'Adresse': info_agent['adresse'],
+                'Telephone': info_agent['tel'],
+                'Societe': info_agent['societe'],
+                'Vehicule': "Non renseigné",
+                'Type_Transport': type_transport,
+                'Jour': jour,
+                'Date_Ajout': date_ajout,
+                'Date_Reelle': date_reelle,
+                'Prix_Course': prix_course,
+                'Statut_Paiement': "Non payé"
+            })
+        
+        return nouvelles_affectations
+    
+    def ajouter_affectation(self, chauffeur, heure, agents_selectionnes, type_transport, jour, prix_specifique=None):
+        """Ajoute une affectation de chauffeur avec la date réelle et le prix"""
+        return self.ajouter_affectations_lot([(chauffeur, heure, agents_selectionnes, type_transport, jour, prix_specifique)])
+    
+    def ajouter_affectations_lot(self, affectations):
+        """Ajoute plusieurs affectations en une seule fois
+        
+        affectations : liste de tuples (chauffeur, heure, agents, type_transport, jour[, prix_specifique]),
+        mêmes arguments que ajouter_affectation. Toutes les lignes sont ajoutées en une
+        seule concaténation et une seule écriture dans le stockage.
+        """
+        nouvelles_affectations = []
+        for affectation in affectations:
+            nouvelles_affectations.extend(self.construire_affectations(*affectation))
+        self.mesures.compter("recherches_annuaire", len(nouvelles_affectations))
+        
+        if not nouvelles_affectations:
+            return False
+        
+        # Sauvegarder en permanent (une seule écriture)
+        return self.enregistrer(self.stockage.ajouter, nouvelles_affectations)
+    
+    def supprimer_affectation(self, index):
+        """Supprime une affectation"""
+        self.supprimer_affectations([index])
+    
+    def supprimer_affectations(self, ids):
+        """Supprime plusieurs affectations en une seule opération du stockage"""
+        self.enregistrer(self.stockage.supprimer, list(ids))
+
+    def supprimer_toutes_affectations(self):
+        """Supprime toutes les affectations"""
+        if self.enregistrer(self.stockage.vider):
+            self.ajouter_diagnostic('succes', "Toutes les affectations ont été supprimées")
+
+    def separer_chauffeurs_taxi(self, df_filtre):
+        """Sépare les chauffeurs Taxi des autres chauffeurs (colonne Est_Taxi calculée au typage)"""
+        est_taxi = df_filtre[COLONNE_TAXI]
+        chauffeurs_taxi = df_filtre[est_taxi]
+        chauffeurs_autres = df_filtre[~est_taxi]
+        
+        return chauffeurs_taxi, chauffeurs_autres
+    
+    def calculer_statistiques_mensuelles(self, mois=None, annee=None):
+        """Calcule les statistiques mensuelles pour la paie (lues dans les cumuls tenus par le stockage)"""
+        if self.df_chauffeurs.empty:
+            return None
+        
+        with self.mesures.span("calculer_statistiques_mensuelles"):
+            return self.stockage.statistiques(mois, annee)
+    
+    def reconstruire_agregats(self):
+        """Recalcule les cumuls de paie à partir de tout l'historique"""
+        with self.mesures.span("reconstruire_agregats"):
+            self.stockage.reconstruire_agregats()
+        self.mesures.compter("affectations_parcourues", len(self.df_chauffeurs))
+    
+    def recalculer_statistiques_mensuelles(self, mois=None, annee=None):
+        """Calcule les statistiques mensuelles en parcourant les affectations (sans les cumuls)"""
+        if self.df_chauffeurs.empty:
+            return None
+        
+        # Filtrer par mois/année si spécifié (requête indexée selon le stockage)
+        with self.mesures.span("selectionner_affectations"):
+            df_filtre = self.stockage.selectionner(mois=mois, annee=annee)
+        self.mesures.compter("affectations_parcourues", len(df_filtre))
+        
+        if df_filtre.empty:
+            return None
+        
+        # Séparer Taxi des autres chauffeurs
+        chauffeurs_taxi, chauffeurs_autres = self.separer_chauffeurs_taxi(df_filtre)
+        
+        statistiques = {
+            'periode': f"{mois}/{annee}" if mois and annee else "Toutes périodes",
+            'total_courses': 0,
+            'chauffeurs_normaux': {},
+            'chauffeurs_taxi': {},
+            'societes_normaux': {},
+            'societes_taxi': {},
+            'details_courses': []
+        }
+        
+        # Une agrégation groupée par catégorie : une course = un triplet (chauffeur, heure, date) distinct
+        for df_categorie, cle_chauffeurs, cle_societes in ((chauffeurs_autres, 'chauffeurs_normaux', 'societes_normaux'),
+                                                           (chauffeurs_taxi, 'chauffeurs_taxi', 'societes_taxi')):
+            if df_categorie.empty:
+                continue
+            
+            # Comme groupby, ignorer les lignes dont la clé de course est incomplète
+            lignes_courses = df_categorie.dropna(subset=['Chauffeur', 'Heure', 'Date_Reelle'])
+            
+            courses_par_chauffeur = (lignes_courses.groupby(['Chauffeur', 'Heure', 'Date_Reelle'], observed=True).size()
+                                     .groupby(level='Chauffeur', observed=True).size())
+            statistiques[cle_chauffeurs] = {chauffeur: int(nb_courses) for chauffeur, nb_courses in courses_par_chauffeur.items()}
+            statistiques['total_courses'] += int(courses_par_chauffeur.sum())
+            
+            # Personnes transportées par société, toutes courses confondues
+            # value_counts d'une catégorie compte aussi les sociétés absentes (0)
+            personnes_par_societe = lignes_courses['Societe'].value_counts()
+            personnes_par_societe = personnes_par_societe[personnes_par_societe > 0]
+            statistiques[cle_societes] = {societe: int(nb_personnes) for societe, nb_personnes in personnes_par_societe.items()}
+        
+        return statistiques
+    
+    def version_affectations(self):
+        """Clé des vues calculées à partir des affectations"""
+        return (self.type_stockage, self.stockage.version)
+    
+    def resume_affectations(self):
+        """Valeurs proposées par les filtres de la liste des affectations (mémorisées)"""
+        def calculer():
+            df = self.df_chauffeurs
+            return {
+                'chauffeurs': sorted(df['Chauffeur'].dropna().unique().tolist()),
+                'statuts': sorted(df['Statut_Paiement'].dropna().unique().tolist())
+            }
+        
+        return self.calcul_memorise('resume_affectations', self.version_affectations(), calculer)
+    
+    def agents_planifies(self):
+        """Agents des listes actuelles par créneau (type de transport, date réelle, heure ramenée sur 24h)
+        
+        Construit une fois par version des listes (ni les listes ni leurs entrées ne
+        sont modifiées sur place) : {créneau: {agent: None}}, dans l'ordre des listes.
+        """
+        entree = self.memo.get('agents_planifies')
+        if entree is None or entree[0] is not self.liste_ramassage_actuelle or entree[1] is not self.liste_depart_actuelle:
+            index = {}
+            for type_transport, liste in (("Ramassage", self.liste_ramassage_actuelle), ("Départ", self.liste_depart_actuelle)):
+                for agent in liste:
+                    heure = agent['Heure'] - 24 if agent['Heure'] >= 24 else agent['Heure']
+                    index.setdefault((type_transport, agent['Date_Reelle'], heure), {})[agent['Agent']] = None
+            # Les listes sont gardées avec l'index : leur identité sert de clé
+            entree = (self.liste_ramassage_actuelle, self.liste_depart_actuelle, index)
+            self.memo['agents_planifies'] = entree
+        return entree[2]
+    
+    def agents_disponibles(self, type_transport, jour, heure):
+        """Agents prévus à ce créneau (type, jour de la semaine du planning, heure) et pas encore affectés à ce créneau"""
+        creneau = (type_transport, self.get_date_du_jour(jour), heure_du_creneau(heure))
+        affectes = self.stockage.agents_affectes(*creneau)
+        return [agent for agent in self.agents_planifies().get(creneau, ()) if agent not in affectes]
+    
+    def filtrer_affectations(self, jour="Tous", chauffeur="Tous", statut="Tous", date_debut=None, date_fin=None):
+        """Affectations filtrées par le stockage ; relancé seulement si les filtres ou les affectations changent"""
+        cle = (self.version_affectations(), jour, chauffeur, statut, date_debut, date_fin)
+        
+        def calculer():
+            with self.mesures.span("selectionner_affectations"):
+                return self.stockage.selectionner(
+                    jour=None if jour == "Tous" else jour,
+                    chauffeur=None if chauffeur == "Tous" else chauffeur,
+                    statut=None if statut == "Tous" else statut,
+                    date_debut=date_debut,
+                    date_fin=date_fin
+                )
+        
+        return self.calcul_memorise('affectations_filtrees', cle, calculer)
+    
+    def paiements_globaux(self):
+        """Paiements sur tout l'historique, recalculés seulement si les affectations ou les prix changent"""
+        cle = (self.version_affectations(), self.prix_course_chauffeur, self.prix_course_taxi)
+        return self.calcul_memorise('paiements_globaux', cle, self.calculer_paiements_mensuels)
+    
+    def calculer_paiements_mensuels(self, mois=None, annee=None, stats=None):
+        """Calcule les paiements mensuels détaillés (stats : statistiques déjà calculées pour la période)"""
+        if stats is None:
+            stats = self.calculer_statistiques_mensuelles(mois, annee)
+        
+        if not stats:
+            return None
+        
+        paiements = {
+            'periode': stats['periode'],
+            'chauffeurs_normaux': {},
+            'chauffeurs_taxi': {},
+            'total_courses': stats['total_courses'],
+            'total_paiements': 0,
+            'details': []
+        }
+        
+        # Calculer les paiements pour les chauffeurs normaux
+        for chauffeur, nb_courses in stats['chauffeurs_normaux'].items():
+            montant = nb_courses * self.prix_course_chauffeur
+            paiements['chauffeurs_normaux'][chauffeur] = {
+                'nb_courses': nb_courses,
+                'montant_total': montant,
+                'prix_unitaire': self.prix_course_chauffeur
+            }
+            paiements['total_paiements'] += montant
+        
+        # Calculer les paiements pour les taxis
+        for chauffeur, nb_courses in stats['chauffeurs_taxi'].items():
+            montant = nb_courses * self.prix_course_taxi
+            paiements['chauffeurs_taxi'][chauffeur] = {
+                'nb_courses': nb_courses,
+                'montant_total': montant,
+                'prix_unitaire': self.prix_course_taxi
+            }
+            paiements['total_paiements'] += montant
+        
+        return paiements
+    
+    def generer_rapport_paie_mensuel(self, mois=None, annee=None):
+        """Génère un rapport détaillé pour la paie mensuelle avec les prix"""
+        # Statistiques calculées une seule fois pour tout le rapport
+        with self.mesures.span("statistiques_paie"):
+            stats = self.calculer_statistiques_mensuelles(mois, annee)
+            paiements = self.calculer_paiements_mensuels(mois, annee, stats=stats)
+        
+        if not paiements or not stats:
+            return None
+        
+        donnees_rapport = []
+        
+        # En-tête
+        donnees_rapport.append(["RAPPORT DE PAIE MENSUEL - TRANSPORT"])
+        donnees_rapport.append([f"Période: {paiements['periode']}"])
+        donnees_rapport.append([f"Total des courses: {stats['total_courses']}"])
+        donnees_rapport.append([f"Total à payer: {paiements['total_paiements']} €"])
+        donnees_rapport.append([])
+        
+        # Chauffeurs normaux avec prix
+        if paiements['chauffeurs_normaux']:
+            donnees_rapport.append(["CHAUFFEURS NORMAUX"])
+            donnees_rapport.append(["Chauffeur", "Nb courses", "Prix/unité", "Montant total"])
+            
+            for chauffeur, details in sorted(paiements['chauffeurs_normaux'].items(), 
+                                           key=lambda x: x[1]['montant_total'], reverse=True):
+                donnees_rapport.append([
+                    chauffeur, 
+                    details['nb_courses'], 
+                    f"{details['prix_unitaire']} €",
+                    f"{details['montant_total']} €"
+                ])
+            
+            donnees_rapport.append([])
+            
+            # Sociétés pour chauffeurs normaux
+            donnees_rapport.append(["RÉPARTITION PAR SOCIÉTÉ - CHAUFFEURS NORMAUX"])
+            donnees_rapport.append(["Société", "Nombre de personnes", "Pourcentage"])
+            
+            total_personnes_normaux = sum(stats['societes_normaux'].values())
+            for societe, count in sorted(stats['societes_normaux'].items(), key=lambda x: x[1], reverse=True):
+                pourcentage = (count / total_personnes_normaux * 100) if total_personnes_normaux > 0 else 0
+                donnees_rapport.append([societe, count, f"{pourcentage:.1f}%"])
+            
+            donnees_rapport.append([])
+        
+        # Chauffeurs Taxi avec prix
+        if paiements['chauffeurs_taxi']:
+            donnees_rapport.append(["CHAUFFEURS TAXI"])
+            donnees_rapport.append(["Chauffeur", "Nb courses", "Prix/unité", "Montant total"])
+            
+            for chauffeur, details in sorted(paiements['chauffeurs_taxi'].items(), 
+                                           key=lambda x: x[1]['montant_total'], reverse=True):
+                donnees_rapport.append([
+                    chauffeur, 
+                    details['nb_courses'], 
+                    f"{details['prix_unitaire']} €",
+                    f"{details['montant_total']} €"
+                ])
+            
+            donnees_rapport.append([])
+            
+            # Sociétés pour Taxi
+            donnees_rapport.append(["RÉPARTITION PAR SOCIÉTÉ - TAXI"])
+            donnees_rapport.append(["Société", "Nombre de personnes", "Pourcentage"])
+            
+            total_personnes_taxi = sum(stats['societes_taxi'].values())
+            for societe, count in sorted(stats['societes_taxi'].items(), key=lambda x: x[1], reverse=True):
+                pourcentage = (count / total_personnes_taxi * 100) if total_personnes_taxi > 0 else 0
+                donnees_rapport.append([societe, count, f"{pourcentage:.1f}%"])
+        
+        # Résumé financier
+        donnees_rapport.append([])
+        donnees_rapport.append(["RÉSUMÉ FINANCIER"])
+        total_chauffeurs_normaux = sum(details['montant_total'] for details in paiements['chauffeurs_normaux'].values())
+        total_taxi = sum(details['montant_total'] for details in paiements['chauffeurs_taxi'].values())
+        
+        donnees_rapport.append([f"Total chauffeurs normaux: {total_chauffeurs_normaux} €"])
+        donnees_rapport.append([f"Total taxis: {total_taxi} €"])
+        donnees_rapport.append([f"TOTAL GÉNÉRAL: {paiements['total_paiements']} €"])
+        
+        return pd.DataFrame(donnees_rapport)
+    
+    def cle_rapport_paie(self, mois, annee):
+        return ("paie", mois, annee, self.version_affectations(), self.prix_course_chauffeur, self.prix_course_taxi)
+    
+    def lancer_rapport_paie(self, mois, annee):
+        """Soumet le rapport de paie au pool de travaux (seules les affectations du mois sont transmises)"""
+        etat = self.etat_detache(self.stockage.selectionner(mois=mois, annee=annee))
+        return self.travaux.soumettre(self.cle_rapport_paie(mois, annee), f"Rapport de paie {mois}/{annee}",
+                                      travail_rapport_paie, etat, mois, annee)
+    
+    def cle_suivi_chauffeurs(self, jour_selectionne_export):
+        return ("suivi", jour_selectionne_export, self.version_affectations(), self.prix_course_chauffeur, self.prix_course_taxi)
+    
+    def lancer_suivi_chauffeurs(self, jour_selectionne_export):
+        """Soumet l'export du suivi des chauffeurs au pool de travaux"""
+        return self.travaux.soumettre(self.cle_suivi_chauffeurs(jour_selectionne_export), "Suivi des chauffeurs",
+                                      travail_suivi_chauffeurs, self.etat_detache(), jour_selectionne_export)
+
+    def exporter_suivi_chauffeurs(self, jour_selectionne_export):
+        """Exporte le suivi des chauffeurs avec statistiques complètes et mise en forme"""
+        lignes = self.lignes_suivi_chauffeurs(jour_selectionne_export)
+        if lignes is None:
+            return None
+        
+        with self.mesures.span("exporter_suivi_chauffeurs"):
+            return pd.DataFrame(list(lignes))
+    
+    def exporter_suivi_chauffeurs_xlsx(self, jour_selectionne_export):
+        """Fichier Excel du suivi des chauffeurs, écrit ligne par ligne au fil des courses"""
+        lignes = self.lignes_suivi_chauffeurs(jour_selectionne_export)
+        if lignes is None:
+            return None
+        
+        with self.mesures.span("exporter_suivi_chauffeurs_xlsx"):
+            return ecrire_xlsx_flux(lignes, 'Suivi_Chauffeurs')
+    
+    def lignes_suivi_chauffeurs(self, jour_selectionne_export):
+        """Lignes (8 colonnes) du suivi des chauffeurs, produites à la demande ; None si aucune donnée"""
+        if self.df_chauffeurs.empty:
+            return None
+        
+        if jour_selectionne_export == "Tous":
+            df_filtre = self.df_chauffeurs
+        else:
+            df_filtre = self.stockage.selectionner(jour=jour_selectionne_export)
+        
+        if df_filtre.empty:
+            return None
+        
+        self.mesures.compter("affectations_exportees", len(df_filtre))
+        return self.generer_lignes_suivi(df_filtre)
+    
+    def generer_lignes_suivi(self, df_filtre):
+        # Séparer Taxi des autres chauffeurs
+        chauffeurs_taxi, chauffeurs_autres = self.separer_chauffeurs_taxi(df_filtre)
+        
+        cumuls = {
+            'normaux': {'courses': 0, 'chauffeurs': {}, 'societes': {}},
+            'taxi': {'courses': 0, 'chauffeurs': {}, 'societes': {}}
+        }
+        
+        # Style d'en-tête avec prix
+        entete_style = ["Salarié", "HEURE", "CHAUFFEUR", "DESTINATION", "Plateau", "type", "date", "Prix"]
+        yield entete_style
+        
+        # Les lignes vides sont retenues jusqu'à la ligne suivante : celles de la fin des courses ne sont pas écrites
+        vides_en_attente = 0
+        for ligne in self.generer_lignes_courses(chauffeurs_autres, chauffeurs_taxi, cumuls):
+            if ligne == LIGNE_VIDE_SUIVI:
+                vides_en_attente += 1
+                continue
+            for _ in range(vides_en_attente):
+                yield list(LIGNE_VIDE_SUIVI)
+            vides_en_attente = 0
+            yield ligne
+        
+        total_courses_normaux = cumuls['normaux']['courses']
+        total_courses_taxi = cumuls['taxi']['courses']
+        statistiques_chauffeurs_normaux = cumuls['normaux']['chauffeurs']
+        statistiques_societes_normaux = cumuls['normaux']['societes']
+        statistiques_chauffeurs_taxi = cumuls['taxi']['chauffeurs']
+        statistiques_societes_taxi = cumuls['taxi']['societes']
+        
+        # STATISTIQUES GLOBALES AVEC PRIX
+        yield ["STATISTIQUES GLOBALES", "", "", "", "", "", "", ""]
+        
+        # Statistiques pour chauffeurs normaux
+        if not chauffeurs_autres.empty:
+            yield ["🚗 CHAUFFEURS NORMAUX", "", "", "", "", "", "", ""]
+            yield [f"Total des courses normales: {total_courses_normaux}", "", "", "", "", "", "", ""]
+            yield [f"Prix unitaire: {self.prix_course_chauffeur} €", "", "", "", "", "", "", ""]
+            
+            # Statistiques par chauffeur normaux
+            yield ["📊 PAR CHAUFFEUR NORMAL", "", "", "", "", "", "", ""]
+            for chauffeur, nb_courses in sorted(statistiques_chauffeurs_normaux.items(), key=lambda x: x[1], reverse=True):
+                pourcentage_chauffeur = (nb_courses / total_courses_normaux * 100) if total_courses_normaux > 0 else 0
+                montant_chauffeur = nb_courses * self.prix_course_chauffeur
+                yield [
+                    "", "", f"{chauffeur}: {nb_courses} courses ({pourcentage_chauffeur:.1f}%) - {montant_chauffeur} €", "", "", "", "", ""
+                ]
+            
+            # Statistiques par société normaux
+            yield ["🏢 PAR SOCIÉTÉ NORMALE", "", "", "", "", "", "", ""]
+            total_personnes_normaux = sum(statistiques_societes_normaux.values())
+            for societe, count in sorted(statistiques_societes_normaux.items(), key=lambda x: x[1], reverse=True):
+                pourcentage_global = (count / total_personnes_normaux * 100) if total_personnes_normaux > 0 else 0
+                yield [
+                    "", "", "", f"{societe}: {count} personnes ({pourcentage_global:.1f}%)", "", "", "", ""
+                ]
+        
+        # Statistiques pour Taxi
+        if not chauffeurs_taxi.empty:
+            yield ["🚕 CHAUFFEURS TAXI", "", "", "", "", "", "", ""]
+            yield [f"Total des courses taxi: {total_courses_taxi}", "", "", "", "", "", "", ""]
+            yield [f"Prix unitaire: {self.prix_course_taxi} €", "", "", "", "", "", "", ""]
+            
+            # Statistiques par chauffeur taxi
+            yield ["📊 PAR CHAUFFEUR TAXI", "", "", "", "", "", "", ""]
+            for chauffeur, nb_courses in sorted(statistiques_chauffeurs_taxi.items(), key=lambda x: x[1], reverse=True):
+                pourcentage_chauffeur = (nb_courses / total_courses_taxi * 100) if total_courses_taxi > 0 else 0
+                montant_chauffeur = nb_courses * self.prix_course_taxi
+                yield [
+                    "", "", f"{chauffeur}: {nb_courses} courses ({pourcentage_chauffeur:.1f}%) - {montant_chauffeur} €", "", "", "", "", ""
+                ]
+            
+            # Statistiques par société taxi
+            yield ["🏢 PAR SOCIÉTÉ TAXI", "", "", "", "", "", "", ""]
+            total_personnes_taxi = sum(statistiques_societes_taxi.values())
+            for societe, count in sorted(statistiques_societes_taxi.items(), key=lambda x: x[1], reverse=True):
+                pourcentage_global = (count / total_personnes_taxi * 100) if total_personnes_taxi > 0 else 0
+                yield [
+                    "", "", "", f"{societe}: {count} personnes ({pourcentage_global:.1f}%)", "", "", "", ""
+                ]
+        
+        # RÉSUMÉ FINAL SIMPLIFIÉ
+        yield ["", "", "", "", "", "", "", ""]
+        yield ["RÉSUMÉ FINAL", "", "", "", "", "", "", ""]
+        total_courses_global = total_courses_normaux + total_courses_taxi
+        total_personnes_global = sum(statistiques_societes_normaux.values()) + sum(statistiques_societes_taxi.values())
+        total_montant_global = (total_courses_normaux * self.prix_course_chauffeur) + (total_courses_taxi * self.prix_course_taxi)
+        
+        yield [f"Total courses toutes catégories: {total_courses_global}", "", "", "", "", "", "", ""]
+        yield [f"Total personnes transportées: {total_personnes_global}", "", "", "", "", "", "", ""]
+        yield [f"TOTAL MONTAANT À PAYER: {total_montant_global} €", "", "", "", "", "", "", ""]
+    
+    def generer_lignes_courses(self, chauffeurs_autres, chauffeurs_taxi, cumuls):
+        """Lignes agent par agent de chaque course, suivies de la répartition par société"""
+        yield ["", "", "", "", "", "", "", ""]
+        
+        ordre_jours = {jour: position for position, jour in enumerate(JOURS_SEMAINE)}
+        
+        # Traiter d'abord les chauffeurs normaux, puis les chauffeurs Taxi
+        categories = [
+            (chauffeurs_autres, cumuls['normaux'], "🚗 CHAUFFEURS NORMAUX", "RÉPARTITION COURSE",
+             # Grouper par jour, chauffeur, heure et type ; trier par date, jour, chauffeur puis heure
+             ['Jour', 'Chauffeur', 'Heure', 'Type_Transport', 'Date_Reelle'],
+             lambda cle: (cle[4], ordre_jours[cle[0]], cle[1], cle[2])),
+            (chauffeurs_taxi, cumuls['taxi'], "🚕 CHAUFFEURS TAXI", "RÉPARTITION COURSE TAXI",
+             # Grouper les courses Taxi ; trier par date, chauffeur, puis heure
+             ['Chauffeur', 'Heure', 'Type_Transport', 'Jour', 'Date_Reelle'],
+             lambda cle: (cle[4], cle[0], cle[1]))
+        ]
+        
+        for df_categorie, cumul, titre, libelle_repartition, cles_groupe, cle_tri in categories:
+            if df_categorie.empty:
+                continue
+            
+            yield [titre, "", "", "", "", "", "", ""]
+            yield ["", "", "", "", "", "", "", ""]
+            
+            # Colonnes lues une fois ; chaque groupe n'est qu'une liste de positions
+            agents = df_categorie['Agent'].tolist()
+            adresses = df_categorie['Adresse'].tolist()
+            societes = df_categorie['Societe'].tolist()
+            prix = df_categorie['Prix_Course'].tolist()
+            
+            groupes = sorted(df_categorie.groupby(cles_groupe, observed=True).indices.items(), key=lambda groupe: groupe[0])
+            groupes.sort(key=lambda groupe: cle_tri(groupe[0]))
+            
+            for cle_groupe, positions in groupes:
+                valeurs_cle = dict(zip(cles_groupe, cle_groupe))
+                chauffeur = valeurs_cle['Chauffeur']
+                heure = valeurs_cle['Heure']
+                type_transport = valeurs_cle['Type_Transport']
+                date_reelle = valeurs_cle['Date_Reelle'].strftime(FORMAT_DATE_REELLE)
+                
+                nb_personnes_course = len(positions)
+                societes_course = {}
+                
+                # Compter par chauffeur
+                cumul['chauffeurs'][chauffeur] = cumul['chauffeurs'].get(chauffeur, 0) + 1
+                
+                # Ajouter chaque agent
+                for position in positions.tolist():
+                    societe = societes[position]
+                    societes_course[societe] = societes_course.get(societe, 0) + 1
+                    cumul['societes'][societe] = cumul['societes'].get(societe, 0) + 1
+                    
+                    yield [
+                        agents[position], f"{heure}", chauffeur, adresses[position],
+                        societe, type_transport.lower(), date_reelle, f"{prix[position]} €"
+                    ]
+                
+                # Ajouter les statistiques de la course
+                if societes_course:
+                    pourcentages = []
+                    for societe, count in societes_course.items():
+                        pourcentage = (count / nb_personnes_course) * 100
+                        pourcentages.append(f"{pourcentage:.0f}% {societe}")
+                    
+                    texte_pourcentages = " + ".join(pourcentages)
+                    yield [
+                        f"{libelle_repartition} ({nb_personnes_course} pers.)", "", "", texte_pourcentages, "", "", "", ""
+                    ]
+                
+                cumul['courses'] += 1
+                yield ["", "", "", "", "", "", "", ""]
+
+    def obtenir_liste_imprimable(self, type_liste):
+        """Liste actuelle (ramassage ou départ) et heures filtrées correspondantes"""
+        parametres = self.parametres_traitement or {}
+        if type_liste == "ramassage":
+            return self.liste_ramassage_actuelle, parametres.get('heures_ramassage', [])
+        return self.liste_depart_actuelle, parametres.get('heures_depart', [])
+    
+    def grouper_liste_par_jour(self, liste):
+        """Regroupe en une passe une liste déjà triée par (jour, heure) : [(jour, agents), ...]"""
+        return [(jour, list(agents)) for jour, agents in groupby(liste, key=lambda agent: agent['Jour'])]
+    
+    def cle_rapport(self, format_rapport, type_liste, jour_selectionne):
+        """Clé du travail produisant un fichier imprimable : tout ce qui détermine son contenu
+        (le gestionnaire de travaux garde les fichiers produits sous cette clé)"""
+        parametres = self.parametres_traitement or {}
+        _, heures = self.obtenir_liste_imprimable(type_liste)
+        return (format_rapport, type_liste, jour_selectionne, tuple(heures), parametres.get('heure_ete_active'),
+                self.empreinte_planning, self.signature_annuaire)
+    
+    def construire_rapport_imprimable(self, type_liste, jour_selectionne, liste, heures):
+        """Fichier Excel de la liste (octets)"""
+        nom_feuille = 'Liste_Ramassage' if type_liste == "ramassage" else 'Liste_Depart'
+        self.mesures.compter("agents_imprimes", len(liste))
+        with self.mesures.span("construire_rapport_imprimable"):
+            return ecrire_xlsx_flux(self.lignes_rapport_imprimable(type_liste, jour_selectionne, liste, heures), nom_feuille)
+    
+    def lancer_liste_imprimable(self, format_rapport, type_liste, jour_selectionne):
+        """Soumet la liste imprimable (format "excel" ou "pdf") au pool de travaux"""
+        libelle = f"Liste {'de ramassage' if type_liste == 'ramassage' else 'de départ'} ({format_rapport.upper()})"
+        return self.travaux.soumettre(self.cle_rapport(format_rapport, type_liste, jour_selectionne), libelle,
+                                      travail_liste_imprimable, self.etat_detache(self.df_chauffeurs.iloc[:0]),
+                                      format_rapport, type_liste, jour_selectionne)
+    
+    def lignes_rapport_imprimable(self, type_liste, jour_selectionne, liste, heures):
+        """Lignes de l'Excel imprimable, regroupées par jour puis par heure en un seul parcours"""
+        parametres = self.parametres_traitement or {}
+        titre = "LISTE DE RAMASSAGE" if type_liste == "ramassage" else "LISTE DE DÉPART"
+        mode_heure = "HEURE D'ÉTÉ" if parametres.get('heure_ete_active') else "HEURE NORMALE"
+        
+        yield [titre]
+        yield [f"Mode : {mode_heure} | Jours : {jour_selectionne} | Heures : {', '.join(f'{h}h' for h in heures)}"]
+        
+        entete = [colonne[0] for colonne in COLONNES_PDF]
+        jour_courant = None
+        # Une section par horaire affiché : 7h et 7h30 ne sont pas confondus
+        for (jour, heure_affichage), agents in groupby(liste, key=lambda agent: (agent['Jour'], agent['Heure_affichage'])):
+            agents = list(agents)
+            if jour != jour_courant:
+                jour_courant = jour
+                yield []
+                yield [f"📅 {jour} ({self.get_date_du_jour(jour)})"]
+            
+            yield [f"🕐 {heure_affichage} - {len(agents)} agent(s)"]
+            yield entete
+            for agent in agents:
+                yield [agent[cle] for _, cle, _, _ in COLONNES_PDF]
+    
+    def construire_pdf_imprimable(self, type_liste, jour_selectionne, liste, heures):
+        """Liste en PDF (A4) : un titre par jour puis un tableau par page"""
+        parametres = self.parametres_traitement or {}
+        titre = "Liste de Ramassage" if type_liste == "ramassage" else "Liste de Départ"
+        mode_heure = "HEURE D'ÉTÉ" if parametres.get('heure_ete_active') else "HEURE NORMALE"
+        # Pas de date d'édition : le fichier est réutilisé tant que cle_rapport ne change pas
+        sous_titre = f"Mode : {mode_heure} | Jours : {jour_selectionne} | Heures : {', '.join(f'{h}h' for h in heures)}"
+        
+        self.mesures.compter("agents_imprimes", len(liste))
+        sections = [
+            (f"{jour} ({self.get_date_du_jour(jour)}) - {len(agents)} agents",
+             [[tronquer_texte(agent[cle], longueur_max) for _, cle, _, longueur_max in COLONNES_PDF] for agent in agents])
+            for jour, agents in self.grouper_liste_par_jour(liste)
+        ]
+        
+        sortie = BytesIO()
+        with self.mesures.span("mise_en_page_pdf"):
+            dessiner_liste_pdf(sortie, titre, sous_titre, sections)
+        return sortie.getvalue()
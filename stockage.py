@@ -0,0 +1,852 @@
+"""Stockage permanent des affectations chauffeurs
+
+Deux implémentations permanentes de la même interface (StockageAffectations) :
+- JournalAffectations : instantané Arrow + journal des opérations en ajout seul
+- StockageSQLite : base SQLite indexée sur les colonnes de filtrage
+StockageMemoire garde les affectations en mémoire seulement (moteur sans
+fichier de sauvegarde, instances détachées des travaux de fond).
+
+Le format xlsx ne sert plus qu'aux imports / exports demandés par
+l'utilisateur ; les anciennes sauvegardes xlsx sont converties au chargement.
+
+Dans les deux cas les affectations sont repérées par un identifiant stable,
+l'index du DataFrame renvoyé. En mémoire, elles suivent le schéma typé de
+typer_affectations (catégories, dates datetime64, Est_Taxi) ; les anciennes
+sauvegardes, toutes en texte, sont converties au chargement.
+"""
+import json
+import os
+import pathlib
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+COLONNES_AFFECTATIONS = [
+    'Chauffeur', 'Heure', 'Agent', 'Adresse', 'Telephone', 'Societe',
+    'Vehicule', 'Type_Transport', 'Jour', 'Date_Ajout', 'Date_Reelle',
+    'Prix_Course', 'Statut_Paiement'
+]
+
+FORMAT_DATE_REELLE = '%d/%m/%Y'
+FORMAT_DATE_AJOUT = '%d/%m/%Y %H:%M'
+
+# Chauffeurs facturés au tarif taxi
+MOTIF_TAXI = 'taxi|Taxi|TAXI'
+
+# Schéma en mémoire : peu de valeurs distinctes → catégories (codes int8). Heure garde
+# son libellé ("00h", "7h") : il fait partie de la clé d'une course et des exports.
+COLONNES_CATEGORIELLES = [
+    'Chauffeur', 'Heure', 'Societe', 'Vehicule', 'Type_Transport', 'Jour', 'Statut_Paiement'
+]
+# Dates en datetime64 ; texte (format ci-dessous) dans les fichiers, SQLite et l'affichage
+COLONNES_DATES = {'Date_Reelle': FORMAT_DATE_REELLE, 'Date_Ajout': FORMAT_DATE_AJOUT}
+# Colonne calculée au typage (jamais sauvegardée) : chauffeur au tarif taxi
+COLONNE_TAXI = 'Est_Taxi'
+
+# Instantané Arrow : catégories et autres colonnes texte répétées encodées en dictionnaire,
+# dates en horodatage, Prix_Course numérique
+COLONNES_DICTIONNAIRE = COLONNES_CATEGORIELLES + ['Agent', 'Adresse', 'Telephone']
+COLONNES_NUMERIQUES = ['Prix_Course']
+# Identifiants stables (index du DataFrame), conservés par l'instantané
+COLONNE_ID_INSTANTANE = 'id'
+
+# Type des textes de pandas : 'str' à partir de pandas 3, object avant ; type des catégories
+TYPE_TEXTE = pd.Series(['']).dtype
+
+# Feuille des anciennes sauvegardes xlsx portant le numéro de séquence du journal
+FEUILLE_JOURNAL_XLSX = 'Journal'
+
+
+def borner_mois(mois, annee):
+    """Premier jour du mois et premier jour du mois suivant, au format AAAA-MM-JJ"""
+    debut = f"{annee:04d}-{mois:02d}-01"
+    fin = f"{annee + 1:04d}-01-01" if mois == 12 else f"{annee:04d}-{mois + 1:02d}-01"
+    return debut, fin
+
+
+@lru_cache(maxsize=1024)
+def heure_du_creneau(heure):
+    """Heure entière d'un créneau ("7h", "00h", 7) ; None si elle n'est pas lisible (peu de valeurs distinctes : cache)"""
+    if isinstance(heure, int):
+        return heure
+    chiffres = re.match(r'\s*(\d{1,2})', str(heure))
+    return int(chiffres.group(1)) if chiffres else None
+
+
+@lru_cache(maxsize=1024)
+def lire_date_reelle(texte):
+    """Date JJ/MM/AAAA au type de la colonne Date_Reelle (NaT si illisible) ; peu de dates distinctes : cache"""
+    return pd.to_datetime(texte, format=FORMAT_DATE_REELLE, errors='coerce')
+
+
+def numeros_jour(dates):
+    """Dates datetime64 en numéros de jour entiers (NaT : plus petit entier), clés de dictionnaire
+    bien plus rapides à créer et à hacher que des Timestamp"""
+    return dates.to_numpy().astype('datetime64[D]').astype('int64').tolist()
+
+
+@lru_cache(maxsize=1024)
+def numero_jour(texte):
+    """Numéro de jour (comme numeros_jour) d'une date JJ/MM/AAAA"""
+    return numeros_jour(pd.Series([lire_date_reelle(texte)], dtype='datetime64[s]'))[0]
+
+
+def categories_texte(serie):
+    """Catégories converties en TYPE_TEXTE (seules les catégories, peu nombreuses, sont converties)"""
+    categories = serie.cat.categories
+    if categories.dtype == TYPE_TEXTE:
+        return serie
+    if len(categories):
+        return serie.cat.rename_categories(categories.astype(TYPE_TEXTE))
+    return serie.cat.set_categories(pd.Index([], dtype=TYPE_TEXTE))
+
+
+def colonne_categorielle(serie):
+    """Catégories de texte ; les valeurs manquantes restent manquantes"""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Déjà typée, ou dictionnaire Arrow relu
+        if pd.api.types.infer_dtype(serie.cat.categories) in ('string', 'empty'):
+            return categories_texte(serie)
+    elif pd.api.types.infer_dtype(serie, skipna=True) not in ('string', 'empty'):
+        # Nombres (téléphone, heure lus dans un xlsx) : convertis en texte, sauf les valeurs manquantes
+        # (astype(str) seul en ferait le texte 'nan' avant pandas 3)
+        texte = serie.astype(object)
+        serie = texte.where(texte.isna(), texte.astype(str))
+    return categories_texte(serie.astype('category'))
+
+
+def colonne_taxi(chauffeurs):
+    """Chauffeurs au tarif taxi : motif cherché une fois par chauffeur distinct, pas par ligne"""
+    taxi_par_categorie = np.asarray(chauffeurs.cat.categories.str.contains(MOTIF_TAXI), dtype=bool)
+    # Code -1 (chauffeur manquant) : dernier élément, False
+    return pd.Series(np.append(taxi_par_categorie, False)[chauffeurs.cat.codes.to_numpy()], index=chauffeurs.index)
+
+
+def typer_affectations(df):
+    """Affectations au schéma en mémoire : catégories, dates datetime64, Est_Taxi
+
+    Les colonnes d'affectation absentes sont ajoutées (vides). Un DataFrame
+    déjà typé est renvoyé tel quel : seuls les dtypes sont examinés.
+    """
+    manquantes = [nom for nom in COLONNES_AFFECTATIONS if nom not in df.columns]
+    if manquantes:
+        df = df.reindex(columns=list(df.columns) + manquantes)
+
+    colonnes = {}
+    for nom in COLONNES_CATEGORIELLES:
+        serie = df[nom]
+        categories = colonne_categorielle(serie)
+        if categories is not serie:
+            colonnes[nom] = categories
+    for nom, format_date in COLONNES_DATES.items():
+        if not pd.api.types.is_datetime64_dtype(df[nom].dtype):
+            colonnes[nom] = pd.to_datetime(df[nom], format=format_date, errors='coerce')
+    if 'Chauffeur' in colonnes or COLONNE_TAXI not in df.columns:
+        colonnes[COLONNE_TAXI] = colonne_taxi(colonnes.get('Chauffeur', df['Chauffeur']))
+
+    return df.assign(**colonnes) if colonnes else df
+
+
+def concatener_affectations(df, nouvelles_lignes):
+    """Ajout de lignes typées à des affectations typées
+
+    Les catégories sont réunies avant la concaténation (qui sinon repasserait
+    en object) ; celles déjà connues gardent leur code.
+    """
+    anciennes_colonnes, nouvelles_colonnes = {}, {}
+    for nom in COLONNES_CATEGORIELLES:
+        categories, ajoutees = df[nom].cat.categories, nouvelles_lignes[nom].cat.categories
+        if ajoutees.equals(categories):
+            continue
+        # Quelques lignes ajoutées : comparaison en Python, moins coûteuse que Index.difference
+        connues = set(categories.tolist())
+        inconnues = [valeur for valeur in ajoutees.tolist() if valeur not in connues]
+        if inconnues:
+            categories = categories.append(pd.Index(inconnues, dtype=categories.dtype))
+            anciennes_colonnes[nom] = df[nom].cat.set_categories(categories)
+        nouvelles_colonnes[nom] = nouvelles_lignes[nom].cat.set_categories(categories)
+    return pd.concat([df.assign(**anciennes_colonnes), nouvelles_lignes.assign(**nouvelles_colonnes)])
+
+
+def affectations_texte(df):
+    """Affectations au format des fichiers (dates en texte, sans Est_Taxi) : exports, SQLite, affichage"""
+    dates = {nom: df[nom].dt.strftime(format_date) for nom, format_date in COLONNES_DATES.items()}
+    return df.drop(columns=COLONNE_TAXI).assign(**dates)
+
+
+def colonne_arrow(serie, nom):
+    """Colonne typée de l'instantané : catégories en dictionnaire, dates en horodatage,
+    nombres si la colonne l'est (ou Prix_Course), texte sinon"""
+    if isinstance(serie.dtype, pd.CategoricalDtype) or pd.api.types.is_datetime64_dtype(serie.dtype):
+        return pa.array(serie, from_pandas=True)
+    if pd.api.types.is_numeric_dtype(serie.dtype) and not pd.api.types.is_bool_dtype(serie.dtype):
+        return pa.array(serie, from_pandas=True)
+    if nom in COLONNES_NUMERIQUES:
+        nombres = pd.to_numeric(serie, errors='coerce')
+        # Aucune valeur perdue à la conversion : sinon la colonne reste du texte
+        if nombres.notna().sum() == serie.notna().sum():
+            return pa.array(nombres, from_pandas=True)
+
+    valeurs = [None if pd.isna(valeur) else str(valeur) for valeur in serie.astype(object).tolist()]
+    colonne = pa.array(valeurs, type=pa.string())
+    return colonne.dictionary_encode() if nom in COLONNES_DICTIONNAIRE else colonne
+
+
+def ecrire_instantane(df, chemin, sequence, prochain_id):
+    """Écrit les affectations et leurs identifiants en Arrow IPC non compressé, via un fichier temporaire"""
+    colonnes = {COLONNE_ID_INSTANTANE: pa.array(df.index.to_numpy(dtype='int64'))}
+    colonnes.update((str(nom), colonne_arrow(df[nom], nom)) for nom in df.columns if nom != COLONNE_TAXI)
+    table = pa.table(colonnes).replace_schema_metadata({'sequence': str(sequence), 'prochain_id': str(prochain_id)})
+
+    fichier_temporaire = chemin + ".tmp"
+    with pa.OSFile(fichier_temporaire, 'wb') as sortie:
+        with pa.ipc.new_file(sortie, table.schema) as ecrivain:
+            ecrivain.write_table(table)
+    os.replace(fichier_temporaire, chemin)
+
+
+def lire_instantane(chemin):
+    """(affectations typées, numéro de séquence, prochain identifiant) d'un instantané Arrow
+
+    Lu en entier : la conversion en DataFrame copie de toute façon chaque colonne.
+    """
+    with pa.OSFile(chemin, 'rb') as source:
+        table = pa.ipc.open_file(source).read_all()
+        # Dictionnaires des colonnes catégorielles relus en catégories ; les autres décodés en texte
+        # (dont Date_Reelle des instantanés antérieurs au schéma typé, convertie par typer_affectations)
+        schema = pa.schema([
+            pa.field(champ.name, champ.type.value_type)
+            if pa.types.is_dictionary(champ.type) and champ.name not in COLONNES_CATEGORIELLES else champ
+            for champ in table.schema
+        ])
+        df = table.cast(schema).to_pandas()
+        metadonnees = table.schema.metadata or {}
+    sequence = int(metadonnees.get(b'sequence', 0))
+    if COLONNE_ID_INSTANTANE in df.columns:
+        df = df.set_index(COLONNE_ID_INSTANTANE)
+        df.index.name = None
+        prochain_id = int(metadonnees.get(b'prochain_id', df.index.max() + 1 if len(df) else 0))
+    else:
+        # Instantanés antérieurs aux identifiants conservés : renumérotés à chaque compactage
+        prochain_id = len(df)
+    return typer_affectations(df), sequence, prochain_id
+
+
+def lire_instantane_xlsx(chemin):
+    """(affectations typées, numéro de séquence, prochain identifiant) d'une ancienne sauvegarde xlsx"""
+    feuilles = pd.read_excel(chemin, sheet_name=None)
+    # Les plus anciennes sauvegardes n'ont qu'une feuille, sans numéro de séquence
+    df = next(iter(feuilles.values())).reset_index(drop=True)
+    sequence = 0
+    if FEUILLE_JOURNAL_XLSX in feuilles and not feuilles[FEUILLE_JOURNAL_XLSX].empty:
+        sequence = int(feuilles[FEUILLE_JOURNAL_XLSX]['sequence'].iloc[0])
+    return typer_affectations(df), sequence, len(df)
+
+
+class AgregatsPaie:
+    """Cumuls de paie par (année, mois, catégorie, chauffeur) et (année, mois, catégorie, société)
+
+    Maintenus à chaque ajout / suppression d'affectations : la paie se lit dans
+    ces cumuls au lieu de parcourir l'historique. Une course est un triplet
+    (Chauffeur, Heure, Date_Reelle) distinct ; catégorie = "normal" ou "taxi".
+    Les montants se déduisent des courses avec le tarif courant, réglable
+    dans l'interface, et ne sont donc pas stockés.
+    """
+    CLE_COURSE = ['Chauffeur', 'Heure', 'Date_Reelle']
+
+    def __init__(self):
+        self.reconstruire(pd.DataFrame(columns=COLONNES_AFFECTATIONS))
+
+    def reconstruire(self, df):
+        """Recalcule tous les cumuls à partir des affectations (reprise après incident)"""
+        self.personnes_par_course = Counter()
+        # (année, mois) → {'courses' | 'personnes' : Counter((catégorie, chauffeur)), 'societes' : Counter((catégorie, société))}
+        self.par_mois = defaultdict(lambda: {'courses': Counter(), 'personnes': Counter(), 'societes': Counter()})
+        self.ajouter(df)
+
+    def ajouter(self, df):
+        self.appliquer(df, 1)
+
+    def retirer(self, df):
+        self.appliquer(df, -1)
+
+    def appliquer(self, df, signe):
+        if df.empty:
+            return
+
+        # Comme groupby, les lignes dont la clé de course est incomplète (ou la date illisible) ne comptent pas
+        lignes = df.dropna(subset=self.CLE_COURSE)
+        dates = lignes['Date_Reelle']
+
+        for annee, mois, jour, taxi, chauffeur, heure, societe in zip(dates.dt.year.tolist(), dates.dt.month.tolist(), numeros_jour(dates),
+                                                                     lignes[COLONNE_TAXI].tolist(), lignes['Chauffeur'].tolist(),
+                                                                     lignes['Heure'].tolist(), lignes['Societe'].tolist()):
+            categorie = "taxi" if taxi else "normal"
+            cumuls = self.par_mois[(annee, mois)]
+
+            # La course n'existe que tant qu'au moins une personne y est affectée
+            cle_course = (categorie, chauffeur, heure, jour)
+            nb_personnes = self.personnes_par_course[cle_course] + signe
+            if nb_personnes > 0:
+                self.personnes_par_course[cle_course] = nb_personnes
+            else:
+                del self.personnes_par_course[cle_course]
+            if (signe > 0 and nb_personnes == 1) or (signe < 0 and nb_personnes == 0):
+                self.incrementer(cumuls['courses'], (categorie, chauffeur), signe)
+
+            self.incrementer(cumuls['personnes'], (categorie, chauffeur), signe)
+            if pd.notna(societe):
+                self.incrementer(cumuls['societes'], (categorie, societe), signe)
+
+    @staticmethod
+    def incrementer(compteur, cle, signe):
+        compteur[cle] += signe
+        if compteur[cle] == 0:
+            del compteur[cle]
+
+    def cumuls(self, mois=None, annee=None):
+        """Copie des cumuls (courses, sociétés) d'un mois ou de toutes les périodes"""
+        if mois and annee:
+            periodes = [self.par_mois[(annee, mois)]] if (annee, mois) in self.par_mois else []
+        else:
+            periodes = list(self.par_mois.values())
+
+        courses, societes = Counter(), Counter()
+        for cumuls in periodes:
+            courses.update(cumuls['courses'])
+            societes.update(cumuls['societes'])
+        return courses, societes
+
+    @staticmethod
+    def statistiques(courses, societes, mois=None, annee=None):
+        """Même résultat que le calcul sur l'historique : dictionnaire des statistiques, ou None"""
+        if not courses and not societes:
+            return None
+
+        statistiques = {
+            'periode': f"{mois}/{annee}" if mois and annee else "Toutes périodes",
+            'total_courses': sum(courses.values()),
+            'chauffeurs_normaux': {},
+            'chauffeurs_taxi': {},
+            'societes_normaux': {},
+            'societes_taxi': {},
+            'details_courses': []
+        }
+        for (categorie, chauffeur), nb_courses in sorted(courses.items(), key=lambda x: x[0][1]):
+            statistiques['chauffeurs_taxi' if categorie == "taxi" else 'chauffeurs_normaux'][chauffeur] = nb_courses
+        for (categorie, societe), nb_personnes in sorted(societes.items(), key=lambda x: x[1], reverse=True):
+            statistiques['societes_taxi' if categorie == "taxi" else 'societes_normaux'][societe] = nb_personnes
+        return statistiques
+
+
+class IndexAffectes:
+    """Agents affectés par créneau (Type_Transport, numéro du jour de Date_Reelle, heure entière)
+
+    Maintenu à chaque ajout / suppression, comme les cumuls de paie : le
+    formulaire d'affectation lit les agents déjà affectés à un créneau sans
+    parcourir l'historique.
+    """
+    def __init__(self):
+        self.reconstruire(pd.DataFrame(columns=COLONNES_AFFECTATIONS))
+
+    def reconstruire(self, df):
+        # créneau → Counter(agent) : un agent peut être affecté deux fois au même créneau
+        self.par_creneau = defaultdict(Counter)
+        self.ajouter(df)
+
+    def ajouter(self, df):
+        self.appliquer(df, 1)
+
+    def retirer(self, df):
+        self.appliquer(df, -1)
+
+    def appliquer(self, df, signe):
+        if df.empty:
+            return
+
+        for type_transport, jour, heure, agent in zip(df['Type_Transport'].tolist(), numeros_jour(df['Date_Reelle']),
+                                                      df['Heure'].tolist(), df['Agent'].tolist()):
+            creneau = (type_transport, jour, heure_du_creneau(heure))
+            agents = self.par_creneau[creneau]
+            AgregatsPaie.incrementer(agents, agent, signe)
+            if not agents:
+                del self.par_creneau[creneau]
+
+    def agents(self, type_transport, date_reelle, heure):
+        """Copie de l'ensemble des agents affectés au créneau ; date_reelle au format JJ/MM/AAAA"""
+        return set(self.par_creneau.get((type_transport, numero_jour(date_reelle), heure_du_creneau(heure)), ()))
+
+
+class StockageAffectations(ABC):
+    """Interface commune des stockages d'affectations
+
+    self.df contient toutes les affectations en mémoire (index = identifiant),
+    au schéma de typer_affectations. Chaque méthode de modification renvoie
+    le nouveau DataFrame.
+    self.version augmente à chaque remplacement de self.df : les vues calculées
+    à partir des affectations la prennent comme clé.
+    """
+    def __init__(self):
+        self.verrou = threading.RLock()
+        self.version = 0
+        self.df = pd.DataFrame(columns=COLONNES_AFFECTATIONS)
+        self.agregats = AgregatsPaie()
+        self.affectes = IndexAffectes()
+        self.charge_depuis_fichier = False
+        self.erreur_chargement = None
+        self.lecture_seule = False
+
+    @property
+    def df(self):
+        return self._df
+
+    @df.setter
+    def df(self, df):
+        self._df = typer_affectations(df)
+        self.version += 1
+
+    def verifier_ecriture(self):
+        if self.lecture_seule:
+            raise PermissionError("Stockage des affectations ouvert en lecture seule")
+
+    @abstractmethod
+    def ajouter(self, lignes):
+        """Ajoute des affectations (liste de dictionnaires) en une seule écriture"""
+
+    @abstractmethod
+    def supprimer(self, ids):
+        """Supprime les affectations d'identifiants ids"""
+
+    @abstractmethod
+    def vider(self):
+        """Supprime toutes les affectations"""
+
+    @abstractmethod
+    def remplacer(self, df):
+        """Remplace toutes les affectations (chargement d'un fichier)"""
+
+    def compacter(self):
+        """Sauvegarde complète de l'état courant"""
+        return self.df
+
+    def reconstruire_agregats(self):
+        """Recalcule les cumuls de paie et l'index des agents affectés à partir de toutes les affectations"""
+        with self.verrou:
+            self.agregats.reconstruire(self.df)
+            self.affectes.reconstruire(self.df)
+
+    def statistiques(self, mois=None, annee=None):
+        """Statistiques de paie lues dans les cumuls, copiés sous le verrou : le stockage est partagé
+        par toutes les sessions Streamlit, dont les threads peuvent le modifier pendant la lecture"""
+        with self.verrou:
+            courses, societes = self.agregats.cumuls(mois, annee)
+        return AgregatsPaie.statistiques(courses, societes, mois, annee)
+
+    def agents_affectes(self, type_transport, date_reelle, heure):
+        """Agents affectés au créneau, copiés sous le verrou (comme statistiques)"""
+        with self.verrou:
+            return self.affectes.agents(type_transport, date_reelle, heure)
+
+    def ajouter_agregats(self, df):
+        self.agregats.ajouter(df)
+        self.affectes.ajouter(df)
+
+    def retirer_agregats(self, df):
+        self.agregats.retirer(df)
+        self.affectes.retirer(df)
+
+    def selectionner(self, mois=None, annee=None, jour=None, chauffeur=None, statut=None, date_debut=None, date_fin=None):
+        """Affectations d'un mois (Date_Reelle), d'un jour de la semaine, d'un chauffeur, d'un statut
+        de paiement et/ou d'une période (date_debut et date_fin : datetime.date, bornes incluses)"""
+        df = self.df
+        if jour is not None:
+            df = df[df['Jour'] == jour]
+        if chauffeur is not None:
+            df = df[df['Chauffeur'] == chauffeur]
+        if statut is not None:
+            df = df[df['Statut_Paiement'] == statut]
+        if (mois and annee) or date_debut is not None or date_fin is not None:
+            dates = df['Date_Reelle']
+            masque = dates.notna()
+            if mois and annee:
+                masque &= (dates.dt.month == mois) & (dates.dt.year == annee)
+            if date_debut is not None:
+                masque &= dates >= pd.Timestamp(date_debut)
+            if date_fin is not None:
+                masque &= dates <= pd.Timestamp(date_fin)
+            df = df[masque]
+        return df
+
+
+class StockageMemoire(StockageAffectations):
+    """Affectations en mémoire seulement, perdues à la fin du processus"""
+
+    def ajouter(self, lignes):
+        with self.verrou:
+            debut = int(self.df.index.max()) + 1 if len(self.df) else 0
+            nouvelles_lignes = typer_affectations(pd.DataFrame(lignes, index=range(debut, debut + len(lignes))))
+            self.df = concatener_affectations(self.df, nouvelles_lignes)
+            self.ajouter_agregats(nouvelles_lignes)
+            return self.df
+
+    def supprimer(self, ids):
+        with self.verrou:
+            ids = [i for i in ids if i in self.df.index]
+            self.retirer_agregats(self.df.loc[ids])
+            self.df = self.df.drop(index=ids)
+            return self.df
+
+    def vider(self):
+        with self.verrou:
+            self.df = pd.DataFrame(columns=COLONNES_AFFECTATIONS)
+            self.reconstruire_agregats()
+            return self.df
+
+    def remplacer(self, df):
+        with self.verrou:
+            self.df = df.reset_index(drop=True)
+            self.reconstruire_agregats()
+            return self.df
+
+
+class JournalAffectations(StockageAffectations):
+    """Affectations persistées en instantané Arrow + journal des opérations en ajout seul
+
+    Chaque modification n'écrit qu'une ligne dans le journal. Tous les
+    seuil_compactage opérations, l'instantané est réécrit et le journal vidé.
+    Au démarrage, l'état est reconstruit en rejouant le journal sur l'instantané.
+    Les affectations sont repérées par un identifiant stable (l'index du DataFrame).
+
+    Les fichiers sont dérivés de fichier_sauvegarde : <racine>.arrow et
+    <racine>.journal. En l'absence d'instantané Arrow, l'ancienne sauvegarde
+    <racine>.xlsx et son journal <racine>.xlsx.journal sont relus puis convertis.
+
+    En lecture seule (rapports en ligne de commande pendant que l'application
+    tourne), les fichiers ne sont jamais modifiés : ni compactage ni migration.
+    """
+    def __init__(self, fichier_sauvegarde, seuil_compactage=500, lecture_seule=False):
+        super().__init__()
+        self.lecture_seule = lecture_seule
+        racine = os.path.splitext(fichier_sauvegarde)[0]
+        self.fichier_instantane = racine + ".arrow"
+        self.fichier_journal = racine + ".journal"
+        self.fichier_xlsx = racine + ".xlsx"
+        self.fichier_journal_xlsx = self.fichier_xlsx + ".journal"
+        self.seuil_compactage = seuil_compactage
+
+        self.sequence = 0             # Numéro de la dernière opération appliquée
+        self.prochain_id = 0
+        self.nb_operations_journal = 0
+
+        try:
+            self.charger()
+        except Exception as e:
+            self.erreur_chargement = e
+
+    def charger(self):
+        """Reconstruit l'état : lecture de l'instantané puis rejeu de la fin du journal"""
+        migration = not os.path.exists(self.fichier_instantane) and (
+            os.path.exists(self.fichier_xlsx) or os.path.exists(self.fichier_journal_xlsx))
+        fichier_journal = self.fichier_journal_xlsx if migration else self.fichier_journal
+        signature = self.signature_instantane()
+
+        self.df = pd.DataFrame(columns=COLONNES_AFFECTATIONS)
+        self.charge_depuis_fichier = False
+        self.nb_operations_journal = 0
+        self.prochain_id = 0
+        sequence_instantane = 0
+        if os.path.exists(self.fichier_instantane):
+            self.df, sequence_instantane, self.prochain_id = lire_instantane(self.fichier_instantane)
+            self.charge_depuis_fichier = True
+        elif migration and os.path.exists(self.fichier_xlsx):
+            self.df, sequence_instantane, self.prochain_id = lire_instantane_xlsx(self.fichier_xlsx)
+            self.charge_depuis_fichier = True
+
+        self.sequence = sequence_instantane
+        self.reconstruire_agregats()
+
+        for operation in self.lire_journal(fichier_journal):
+            # Opérations déjà incluses dans l'instantané (compactage interrompu avant la troncature)
+            if operation['seq'] <= sequence_instantane:
+                continue
+            self.appliquer(operation)
+            self.sequence = operation['seq']
+            self.nb_operations_journal += 1
+            self.charge_depuis_fichier = True
+
+        if self.lecture_seule:
+            # L'application a compacté pendant la lecture : le journal relu ne suit plus l'instantané relu
+            if self.signature_instantane() != signature:
+                self.charger()
+        elif migration:
+            # Premier instantané Arrow ; l'ancien xlsx reste en place, son journal est déjà inclus
+            self.compacter()
+            if os.path.exists(self.fichier_journal_xlsx):
+                os.remove(self.fichier_journal_xlsx)
+        elif self.nb_operations_journal >= self.seuil_compactage:
+            self.compacter()
+
+    def signature_instantane(self):
+        """Identité du fichier instantané (remplacé à chaque compactage), None s'il n'existe pas"""
+        try:
+            etat = os.stat(self.fichier_instantane)
+        except FileNotFoundError:
+            return None
+        return etat.st_ino, etat.st_mtime_ns, etat.st_size
+
+    def lire_journal(self, fichier_journal):
+        if not os.path.exists(fichier_journal):
+            return
+        with open(fichier_journal, encoding='utf-8') as journal:
+            for ligne in journal:
+                try:
+                    yield json.loads(ligne)
+                except ValueError:
+                    # Dernière ligne tronquée par un arrêt brutal : elle n'a jamais été appliquée
+                    return
+
+    def appliquer(self, operation):
+        """Applique une opération du journal à l'état en mémoire"""
+        if operation['op'] == 'ajout':
+            nouvelles_lignes = typer_affectations(pd.DataFrame(operation['lignes'], index=operation['ids']))
+            self.df = concatener_affectations(self.df, nouvelles_lignes)
+            self.prochain_id = max(self.prochain_id, max(operation['ids']) + 1)
+            self.ajouter_agregats(nouvelles_lignes)
+        elif operation['op'] == 'suppression':
+            ids = [i for i in operation['ids'] if i in self.df.index]
+            self.retirer_agregats(self.df.loc[ids])
+            self.df = self.df.drop(index=ids)
+        elif operation['op'] == 'vider':
+            self.df = pd.DataFrame(columns=COLONNES_AFFECTATIONS)
+            self.reconstruire_agregats()
+
+    def journaliser(self, operation):
+        """Écrit l'opération dans le journal (avant de l'appliquer), puis l'applique"""
+        self.verifier_ecriture()
+        with self.verrou:
+            operation = {'seq': self.sequence + 1, **operation}
+            with open(self.fichier_journal, 'a', encoding='utf-8') as journal:
+                journal.write(json.dumps(operation, ensure_ascii=False, default=str) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+
+            self.appliquer(operation)
+            self.sequence = operation['seq']
+            self.nb_operations_journal += 1
+
+            if self.nb_operations_journal >= self.seuil_compactage:
+                self.compacter()
+            return self.df
+
+    def ajouter(self, lignes):
+        """Ajoute des affectations (liste de dictionnaires) en une seule écriture"""
+        with self.verrou:
+            ids = list(range(self.prochain_id, self.prochain_id + len(lignes)))
+            return self.journaliser({'op': 'ajout', 'ids': ids, 'lignes': lignes})
+
+    def supprimer(self, ids):
+        return self.journaliser({'op': 'suppression', 'ids': [int(i) for i in ids]})
+
+    def vider(self):
+        return self.journaliser({'op': 'vider'})
+
+    def remplacer(self, df):
+        """Remplace toutes les affectations (chargement d'un fichier) : instantané complet
+
+        Les nouvelles lignes reçoivent de nouveaux identifiants, jamais ceux des affectations remplacées."""
+        self.verifier_ecriture()
+        with self.verrou:
+            self.df = df.set_axis(range(self.prochain_id, self.prochain_id + len(df)))
+            self.prochain_id += len(df)
+            self.reconstruire_agregats()
+            self.compacter()
+            return self.df
+
+    def compacter(self):
+        """Réécrit l'instantané avec l'état courant et vide le journal (identifiants conservés)"""
+        self.verifier_ecriture()
+        with self.verrou:
+            ecrire_instantane(self.df, self.fichier_instantane, self.sequence, self.prochain_id)
+
+            # Un arrêt ici laisse des opérations déjà présentes dans l'instantané : ignorées au rejeu
+            open(self.fichier_journal, 'w').close()
+            self.nb_operations_journal = 0
+            return self.df
+
+
+class StockageSQLite(StockageAffectations):
+    """Affectations dans une base SQLite indexée
+
+    Index : (date, Chauffeur, Heure) pour la paie mensuelle, Jour pour les
+    exports par jour, Agent pour les recherches par agent. Date_Reelle
+    (JJ/MM/AAAA) est doublée d'une colonne Date_ISO (AAAA-MM-JJ) pour que
+    les filtres par mois soient des plages d'index.
+    Au premier lancement, la sauvegarde existante (Arrow ou ancien xlsx) est importée.
+    En lecture seule, la base est ouverte sans droit d'écriture ; si elle n'existe
+    pas encore, la sauvegarde existante est importée dans une base en mémoire.
+    """
+    TYPES_COLONNES = {'Prix_Course': 'NUMERIC'}
+
+    def __init__(self, fichier_base, fichier_import=None, lecture_seule=False):
+        super().__init__()
+        self.fichier_base = fichier_base
+        self.lecture_seule = lecture_seule
+        base_existante = lecture_seule and os.path.exists(fichier_base)
+        if base_existante:
+            self.connexion = sqlite3.connect(pathlib.Path(fichier_base).resolve().as_uri() + "?mode=ro", uri=True,
+                                             check_same_thread=False, isolation_level=None)
+        else:
+            self.connexion = sqlite3.connect(":memory:" if lecture_seule else fichier_base,
+                                             check_same_thread=False, isolation_level=None)
+            self.connexion.execute("PRAGMA journal_mode=WAL")
+            self.connexion.execute("PRAGMA synchronous=NORMAL")
+
+        try:
+            if not base_existante:
+                self.creer_schema()
+            if fichier_import and not base_existante and self.compter() == 0:
+                # Migration : instantané + journal de l'ancien stockage
+                ancien_stockage = JournalAffectations(fichier_import, lecture_seule=lecture_seule)
+                if ancien_stockage.erreur_chargement is not None:
+                    raise ancien_stockage.erreur_chargement
+                if ancien_stockage.charge_depuis_fichier:
+                    self.inserer(ancien_stockage.df)
+            self.df = self.lire()
+            self.reconstruire_agregats()
+            self.charge_depuis_fichier = not self.df.empty
+        except Exception as e:
+            self.erreur_chargement = e
+
+    def creer_schema(self):
+        colonnes = ", ".join(f'"{col}" {self.TYPES_COLONNES.get(col, "TEXT")}' for col in COLONNES_AFFECTATIONS)
+        self.connexion.executescript(f"""
+            CREATE TABLE IF NOT EXISTS affectations (id INTEGER PRIMARY KEY, {colonnes}, Date_ISO TEXT);
+            CREATE INDEX IF NOT EXISTS idx_affectations_date_chauffeur_heure ON affectations (Date_ISO, Chauffeur, Heure);
+            CREATE INDEX IF NOT EXISTS idx_affectations_jour ON affectations (Jour);
+            CREATE INDEX IF NOT EXISTS idx_affectations_agent ON affectations (Agent);
+            CREATE INDEX IF NOT EXISTS idx_affectations_chauffeur ON affectations (Chauffeur);
+        """)
+
+    def compter(self):
+        return self.connexion.execute("SELECT COUNT(*) FROM affectations").fetchone()[0]
+
+    def lire(self, where="", parametres=()):
+        """Affectations correspondant à la clause WHERE, index = id"""
+        colonnes = ", ".join(f'"{col}"' for col in COLONNES_AFFECTATIONS)
+        with self.verrou:
+            df = pd.read_sql_query(f"SELECT id, {colonnes} FROM affectations {where} ORDER BY id",
+                                   self.connexion, params=parametres, index_col='id')
+        df.index.name = None
+        return typer_affectations(df)
+
+    def inserer(self, df, vider_avant=False):
+        """Insère les lignes de df dans une transaction ; renvoie les identifiants attribués"""
+        df = typer_affectations(df)
+        dates_iso = df['Date_Reelle'].dt.strftime('%Y-%m-%d')
+        # Même texte qu'avant le schéma typé : les bases existantes restent homogènes
+        texte = affectations_texte(df)[COLONNES_AFFECTATIONS]
+        valeurs = texte.astype(object).where(texte.notna(), None)
+
+        with self.verrou:
+            self.connexion.execute("BEGIN IMMEDIATE")
+            try:
+                if vider_avant:
+                    self.connexion.execute("DELETE FROM affectations")
+                premier_id = self.connexion.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM affectations").fetchone()[0]
+                ids = list(range(premier_id, premier_id + len(df)))
+                lignes = [
+                    (id_ligne, *ligne, date_iso if isinstance(date_iso, str) else None)
+                    for id_ligne, ligne, date_iso in zip(ids, valeurs.itertuples(index=False, name=None), dates_iso.tolist())
+                ]
+                marques = ", ".join("?" * (len(COLONNES_AFFECTATIONS) + 2))
+                self.connexion.executemany(f"INSERT INTO affectations VALUES ({marques})", lignes)
+                self.connexion.execute("COMMIT")
+            except Exception:
+                self.connexion.execute("ROLLBACK")
+                raise
+        return ids
+
+    def ajouter(self, lignes):
+        self.verifier_ecriture()
+        with self.verrou:
+            nouvelles_lignes = typer_affectations(pd.DataFrame(lignes, columns=COLONNES_AFFECTATIONS))
+            nouvelles_lignes.index = self.inserer(nouvelles_lignes)
+            self.df = concatener_affectations(self.df, nouvelles_lignes)
+            self.ajouter_agregats(nouvelles_lignes)
+            return self.df
+
+    def supprimer(self, ids):
+        self.verifier_ecriture()
+        with self.verrou:
+            ids = [int(i) for i in ids]
+            # Une seule transaction pour toute la sélection
+            self.connexion.execute("BEGIN IMMEDIATE")
+            try:
+                self.connexion.executemany("DELETE FROM affectations WHERE id = ?", [(i,) for i in ids])
+                self.connexion.execute("COMMIT")
+            except Exception:
+                self.connexion.execute("ROLLBACK")
+                raise
+            ids = [i for i in ids if i in self.df.index]
+            self.retirer_agregats(self.df.loc[ids])
+            self.df = self.df.drop(index=ids)
+            return self.df
+
+    def vider(self):
+        self.verifier_ecriture()
+        with self.verrou:
+            self.connexion.execute("DELETE FROM affectations")
+            self.df = pd.DataFrame(columns=COLONNES_AFFECTATIONS)
+            self.reconstruire_agregats()
+            return self.df
+
+    def remplacer(self, df):
+        self.verifier_ecriture()
+        with self.verrou:
+            self.inserer(df, vider_avant=True)
+            self.df = self.lire()
+            self.reconstruire_agregats()
+            return self.df
+
+    def selectionner(self, mois=None, annee=None, jour=None, chauffeur=None, statut=None, date_debut=None, date_fin=None):
+        """Requête indexée : seules les lignes correspondant aux filtres sont lues"""
+        conditions, parametres = [], []
+        if mois and annee:
+            conditions.append("Date_ISO >= ? AND Date_ISO < ?")
+            parametres.extend(borner_mois(mois, annee))
+        if date_debut is not None:
+            conditions.append("Date_ISO >= ?")
+            parametres.append(date_debut.strftime('%Y-%m-%d'))
+        if date_fin is not None:
+            conditions.append("Date_ISO <= ?")
+            parametres.append(date_fin.strftime('%Y-%m-%d'))
+        if jour is not None:
+            conditions.append("Jour = ?")
+            parametres.append(jour)
+        if chauffeur is not None:
+            conditions.append("Chauffeur = ?")
+            parametres.append(chauffeur)
+        if statut is not None:
+            conditions.append("Statut_Paiement = ?")
+            parametres.append(statut)
+        if not conditions:
+            return self.df
+        return self.lire("WHERE " + " AND ".join(conditions), parametres)
+
+
+def ouvrir_stockage(type_stockage, fichier_sauvegarde, lecture_seule=False):
+    """Crée le stockage demandé : "journal" (instantané Arrow + journal) ou "sqlite" ;
+    en lecture seule, les fichiers ne sont jamais modifiés"""
+    if type_stockage == "sqlite":
+        fichier_base = os.path.splitext(fichier_sauvegarde)[0] + ".sqlite3"
+        return StockageSQLite(fichier_base, fichier_import=fichier_sauvegarde, lecture_seule=lecture_seule)
+    if type_stockage == "journal":
+        return JournalAffectations(fichier_sauvegarde, lecture_seule=lecture_seule)
+    raise ValueError(f"Type de stockage inconnu : {type_stockage}")
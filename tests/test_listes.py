@@ -0,0 +1,164 @@
+"""Tests des listes de ramassage et de départ, des agents disponibles par créneau
+et des fichiers imprimables
+
+Usage : python -m pytest tests
+"""
+import hashlib
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from moteur import COLONNES_PLANNING, JOURS_SEMAINE, MoteurTransport
+from stockage import heure_du_creneau, lire_date_reelle
+
+# Horaires variés : demi-heures, nuit, horaires coupés, absences, cellules vides
+HORAIRES = ["7h-16h", "8h30-17h30", "6h-15h", "22h-7h", "14h-23h", "15h-00h", "16h-1h30", "8h-17h",
+            "7h-11h/14h-18h", "6h-10h/22h-2h", "REPOS", "CONGÉ PAYÉ", None, "9h-18h", "23h-8h"]
+DATES = {jour: f"{5 + i:02d}/01/2026" for i, jour in enumerate(JOURS_SEMAINE)}
+HEURES_RAMASSAGE = [6, 7, 8, 22]
+HEURES_DEPART = [22, 23, 0, 1, 2, 3]
+
+
+def nom_agent(i):
+    return f"NOM{i:03d} Prénom{i:03d}"
+
+
+def planning(nb_agents, decalage=0):
+    """Planning d'une semaine : l'horaire d'un agent dépend de son rang, du jour et de decalage"""
+    return pd.DataFrame([
+        [nom_agent(i)] + [HORAIRES[(i + j * 5 + decalage) % len(HORAIRES)] for j in range(7)] + ["Conseiller"]
+        for i in range(nb_agents)
+    ], columns=COLONNES_PLANNING)
+
+
+@pytest.fixture
+def fichier_infos(tmp_path):
+    """Annuaire des 40 agents du planning ; les trois premiers ont une voiture"""
+    chemin = str(tmp_path / "info.xlsx")
+    pd.DataFrame({
+        'voyant': [nom_agent(i) for i in range(40)],
+        'adresse': [f"{i} rue de la Gare" for i in range(40)],
+        'Mobile': [20000000 + i for i in range(40)],
+        'societe': ["Hannibal" if i % 2 else "Astragale" for i in range(40)],
+        'voiture': ['oui' if i < 3 else 'non' for i in range(40)],
+    }).to_excel(chemin, index=False)
+    return chemin
+
+
+def creer_gestion(fichier_infos, df_planning, mode_traitement="colonnes"):
+    gestion = MoteurTransport(fichier_infos=fichier_infos)
+    gestion.charger_infos_agents()
+    charger(gestion, df_planning)
+    gestion.mode_traitement = mode_traitement
+    return gestion
+
+
+def charger(gestion, df_planning):
+    """Comme charger_planning, pour un planning déjà lu"""
+    gestion.df = df_planning
+    gestion.dates_par_jour = dict(DATES)
+    gestion.empreinte_planning = hashlib.sha256(df_planning.to_csv().encode()).hexdigest()
+
+
+def entree_liste(agent, jour, heure, heure_affichage):
+    """Entrée de liste au format de traiter_donnees"""
+    return {'Agent': agent, 'Jour': jour, 'Heure': heure, 'Heure_affichage': heure_affichage, 'Adresse': "",
+            'Telephone': "", 'Societe': "", 'Voiture': "Non", 'Date_Reelle': ""}
+
+
+def test_sections_par_horaire_affiche():
+    gestion = MoteurTransport()
+    gestion.parametres_traitement = {'heure_ete_active': False}
+    liste = [entree_liste("A", "Lundi", 7, "7h"), entree_liste("B", "Lundi", 7, "7h"),
+             entree_liste("C", "Lundi", 7, "7h30"), entree_liste("D", "Mardi", 7, "7h30")]
+
+    lignes = list(gestion.lignes_rapport_imprimable("ramassage", "Tous", liste, [7]))
+
+    sections = [ligne[0] for ligne in lignes if ligne and str(ligne[0]).startswith("🕐")]
+    assert sections == ["🕐 7h - 2 agent(s)", "🕐 7h30 - 1 agent(s)", "🕐 7h30 - 1 agent(s)"]
+
+
+@pytest.mark.parametrize("heure_ete_active", [False, True])
+@pytest.mark.parametrize("jour_selectionne", ["Tous", "Mardi"])
+def test_listes_colonnes_identiques_aux_lignes(fichier_infos, heure_ete_active, jour_selectionne):
+    listes = []
+    for mode_traitement in ("colonnes", "lignes"):
+        gestion = creer_gestion(fichier_infos, planning(40), mode_traitement)
+        gestion.traiter_donnees(heure_ete_active, jour_selectionne, HEURES_RAMASSAGE, HEURES_DEPART)
+        listes.append((gestion.liste_ramassage_actuelle, gestion.liste_depart_actuelle))
+
+    assert listes[0][0] and listes[0][1]
+    assert listes[0] == listes[1]
+
+
+@pytest.mark.parametrize("heure_ete_active", [False, True])
+def test_mise_a_jour_identique_au_calcul_complet(monkeypatch, fichier_infos, heure_ete_active):
+    ancien = planning(40)
+    nouveau = ancien.copy()
+    # Planning révisé : quelques horaires modifiés, dont un ajouté et un retiré
+    nouveau.loc[4, 'Lundi'] = "8h30-17h30"
+    nouveau.loc[7, 'Mardi'] = "REPOS"
+    nouveau.loc[12, 'Mercredi'] = "22h-7h"
+    nouveau.loc[20, 'Dimanche'] = "7h-11h/14h-18h"
+    nouveau.loc[1, 'Jeudi'] = "6h-15h"
+
+    mises_a_jour = []
+    mettre_a_jour_listes = MoteurTransport.mettre_a_jour_listes
+    def compter_mise_a_jour(gestion, *args):
+        mises_a_jour.append(args)
+        return mettre_a_jour_listes(gestion, *args)
+    monkeypatch.setattr(MoteurTransport, 'mettre_a_jour_listes', compter_mise_a_jour)
+
+    gestion = creer_gestion(fichier_infos, ancien)
+    gestion.preparer_listes(heure_ete_active, "Tous", HEURES_RAMASSAGE, HEURES_DEPART)
+    charger(gestion, nouveau)
+    gestion.preparer_listes(heure_ete_active, "Tous", HEURES_RAMASSAGE, HEURES_DEPART)
+
+    reference = creer_gestion(fichier_infos, nouveau)
+    reference.traiter_donnees(heure_ete_active, "Tous", HEURES_RAMASSAGE, HEURES_DEPART)
+
+    assert len(mises_a_jour) == 1
+    assert gestion.liste_ramassage_actuelle == reference.liste_ramassage_actuelle
+    assert gestion.liste_depart_actuelle == reference.liste_depart_actuelle
+
+
+def agents_disponibles_historique(gestion, type_transport, jour, heure):
+    """Calcul de référence : listes et affectations parcourues ligne par ligne"""
+    date_reelle = gestion.get_date_du_jour(jour)
+    liste = gestion.liste_ramassage_actuelle if type_transport == "Ramassage" else gestion.liste_depart_actuelle
+    affectes = {
+        affectation['Agent'] for _, affectation in gestion.df_chauffeurs.iterrows()
+        if affectation['Type_Transport'] == type_transport and affectation['Date_Reelle'] == lire_date_reelle(date_reelle)
+        and heure_du_creneau(affectation['Heure']) == heure
+    }
+    planifies = [agent['Agent'] for agent in liste
+                 if agent['Date_Reelle'] == date_reelle and agent['Heure'] % 24 == heure]
+    return [agent for agent in dict.fromkeys(planifies) if agent not in affectes]
+
+
+def test_agents_disponibles_apres_ajout_et_suppression(fichier_infos):
+    gestion = creer_gestion(fichier_infos, planning(40))
+    gestion.preparer_listes(False, "Tous", HEURES_RAMASSAGE, HEURES_DEPART)
+    creneaux = [("Ramassage", jour, heure) for jour in ("Lundi", "Mardi") for heure in HEURES_RAMASSAGE]
+    creneaux += [("Départ", jour, heure) for jour in ("Lundi", "Mardi") for heure in HEURES_DEPART]
+
+    def verifier():
+        for creneau in creneaux:
+            assert gestion.agents_disponibles(*creneau) == agents_disponibles_historique(gestion, *creneau)
+
+    verifier()
+    agents = gestion.agents_disponibles("Ramassage", "Lundi", 7)
+    assert len(agents) >= 3
+    gestion.ajouter_affectation("NOM000 Prénom000", "7h", agents[:3], "Ramassage", "Lundi")
+    gestion.ajouter_affectation("NOM001 Prénom001", "22h", gestion.agents_disponibles("Départ", "Mardi", 22)[:2],
+                                "Départ", "Mardi")
+    assert gestion.agents_disponibles("Ramassage", "Lundi", 7) == agents[3:]
+    verifier()
+
+    gestion.supprimer_affectations(gestion.df_chauffeurs.index[[1]])
+    assert gestion.agents_disponibles("Ramassage", "Lundi", 7) == [agents[1]] + agents[3:]
+    verifier()
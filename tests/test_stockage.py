@@ -0,0 +1,258 @@
+"""Tests du stockage des affectations : rechargement du journal, migration xlsx,
+identité des stockages journal et SQLite
+
+Usage : python -m pytest tests
+"""
+import json
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stockage import COLONNES_AFFECTATIONS, JournalAffectations, StockageSQLite, affectations_texte, ouvrir_stockage
+
+
+def affectation(i, chauffeur="Chauffeur 1", date_reelle="05/01/2026"):
+    """Affectation au format des fichiers (tout en texte, sauf le prix)"""
+    return {
+        'Chauffeur': chauffeur,
+        'Heure': "7h",
+        'Agent': f"Agent {i}",
+        'Adresse': f"{i} rue du test",
+        'Telephone': f"+216 20 000 {i:03d}",
+        'Societe': "Hannibal" if i % 2 else "Astragale",
+        'Vehicule': "Voiture 1",
+        'Type_Transport': "Ramassage",
+        'Jour': "Lundi",
+        'Date_Ajout': "01/01/2026 10:00",
+        'Date_Reelle': date_reelle,
+        'Prix_Course': 10,
+        'Statut_Paiement': "Non payé",
+    }
+
+
+def attendu(lignes, ids):
+    """DataFrame attendu : affectations au format des fichiers, index = identifiants"""
+    return pd.DataFrame(lignes, index=ids, columns=COLONNES_AFFECTATIONS)
+
+
+def verifier_affectations(df, df_attendu):
+    """Mêmes affectations, mêmes identifiants, comparées au format des fichiers"""
+    texte = affectations_texte(df)[COLONNES_AFFECTATIONS]
+    pd.testing.assert_frame_equal(texte.astype(object), df_attendu.astype(object), check_index_type=False)
+
+
+@pytest.fixture
+def fichier_sauvegarde(tmp_path):
+    return str(tmp_path / "affectations.xlsx")
+
+
+def test_ajout_puis_rechargement(fichier_sauvegarde):
+    lignes = [affectation(i) for i in range(5)]
+    journal = JournalAffectations(fichier_sauvegarde)
+    journal.ajouter(lignes[:3])
+    journal.supprimer([1])
+    journal.ajouter(lignes[3:])
+
+    recharge = JournalAffectations(fichier_sauvegarde)
+
+    assert recharge.erreur_chargement is None
+    assert recharge.nb_operations_journal == 3
+    verifier_affectations(recharge.df, attendu([lignes[0], lignes[2], lignes[3], lignes[4]], [0, 2, 3, 4]))
+
+
+def test_compactage_puis_rechargement(fichier_sauvegarde):
+    lignes = [affectation(i) for i in range(5)]
+    journal = JournalAffectations(fichier_sauvegarde, seuil_compactage=2)
+    journal.ajouter(lignes[:3])
+    journal.supprimer([0])
+    # Compactage : identifiants conservés, journal vidé ; l'ajout suivant est journalisé après l'instantané
+    journal.ajouter(lignes[3:])
+
+    with open(journal.fichier_journal, encoding='utf-8') as fichier:
+        assert len(fichier.readlines()) == 1
+
+    recharge = JournalAffectations(fichier_sauvegarde, seuil_compactage=2)
+
+    assert recharge.erreur_chargement is None
+    verifier_affectations(recharge.df, attendu(lignes[1:], [1, 2, 3, 4]))
+
+    # Le plus grand identifiant supprimé puis compacté n'est jamais réattribué
+    recharge.supprimer([4])
+    recharge = JournalAffectations(fichier_sauvegarde, seuil_compactage=2)
+    recharge.ajouter(lignes[4:])
+    verifier_affectations(recharge.df, attendu(lignes[1:], [1, 2, 3, 5]))
+
+
+def test_instantane_sans_identifiants(fichier_sauvegarde):
+    lignes = [affectation(i) for i in range(3)]
+    journal = JournalAffectations(fichier_sauvegarde)
+    journal.ajouter(lignes)
+    journal.compacter()
+    # Instantané antérieur aux identifiants conservés : ni colonne id ni prochain_id
+    table = pa.ipc.open_file(journal.fichier_instantane).read_all()
+    table = table.drop_columns(['id']).replace_schema_metadata({'sequence': table.schema.metadata[b'sequence']})
+    with pa.OSFile(journal.fichier_instantane, 'wb') as sortie:
+        with pa.ipc.new_file(sortie, table.schema) as ecrivain:
+            ecrivain.write_table(table)
+
+    recharge = JournalAffectations(fichier_sauvegarde)
+    recharge.ajouter(lignes[:1])
+
+    assert recharge.erreur_chargement is None
+    verifier_affectations(recharge.df, attendu(lignes + lignes[:1], [0, 1, 2, 3]))
+
+
+def test_journal_tronque(fichier_sauvegarde):
+    lignes = [affectation(i) for i in range(3)]
+    journal = JournalAffectations(fichier_sauvegarde)
+    journal.ajouter(lignes)
+
+    # Arrêt brutal pendant l'écriture de l'opération suivante
+    operation = json.dumps({'seq': journal.sequence + 1, 'op': 'suppression', 'ids': [0, 1, 2]})
+    with open(journal.fichier_journal, 'a', encoding='utf-8') as fichier:
+        fichier.write(operation[:len(operation) // 2])
+
+    recharge = JournalAffectations(fichier_sauvegarde)
+
+    assert recharge.erreur_chargement is None
+    assert recharge.sequence == 1
+    verifier_affectations(recharge.df, attendu(lignes, [0, 1, 2]))
+
+
+def test_migration_depuis_xlsx(fichier_sauvegarde):
+    lignes = [affectation(i) for i in range(4)]
+    # Ancienne sauvegarde : xlsx d'une seule feuille et son journal
+    pd.DataFrame(lignes[:3], columns=COLONNES_AFFECTATIONS).to_excel(fichier_sauvegarde, index=False)
+    with open(fichier_sauvegarde + ".journal", 'w', encoding='utf-8') as fichier:
+        fichier.write(json.dumps({'seq': 1, 'op': 'ajout', 'ids': [3], 'lignes': [lignes[3]]}) + "\n")
+        fichier.write(json.dumps({'seq': 2, 'op': 'suppression', 'ids': [0]}) + "\n")
+
+    journal = JournalAffectations(fichier_sauvegarde)
+
+    assert journal.erreur_chargement is None
+    assert os.path.exists(journal.fichier_instantane)
+    assert not os.path.exists(fichier_sauvegarde + ".journal")
+    # Premier instantané Arrow écrit à la migration : identifiants du journal conservés
+    verifier_affectations(journal.df, attendu(lignes[1:], [1, 2, 3]))
+
+    recharge = JournalAffectations(fichier_sauvegarde)
+
+    assert recharge.erreur_chargement is None
+    verifier_affectations(recharge.df, attendu(lignes[1:], [1, 2, 3]))
+
+
+def test_sqlite_identique_au_journal(tmp_path):
+    # Deux mois, un chauffeur taxi, plusieurs agents par course
+    lignes = [
+        affectation(i, chauffeur=["Chauffeur 1", "Chauffeur 2", "Taxi 1"][i % 3],
+                    date_reelle=["05/01/2026", "06/01/2026", "03/02/2026"][i % 4 % 3])
+        for i in range(24)
+    ]
+    journal = JournalAffectations(str(tmp_path / "affectations.xlsx"))
+    base = StockageSQLite(str(tmp_path / "affectations.sqlite3"))
+
+    for stockage in (journal, base):
+        stockage.ajouter(lignes[:16])
+        # Mêmes affectations supprimées : les identifiants diffèrent d'un stockage à l'autre
+        stockage.supprimer(stockage.df.index[[0, 3, 4, 10]])
+        stockage.ajouter(lignes[16:])
+        stockage.supprimer(stockage.df.index[[-1]])
+
+    journal_recharge = JournalAffectations(str(tmp_path / "affectations.xlsx"))
+    base_rechargee = StockageSQLite(str(tmp_path / "affectations.sqlite3"))
+
+    df_attendu = attendu([ligne for i, ligne in enumerate(lignes[:-1]) if i not in (0, 3, 4, 10)], range(19))
+    for stockage in (journal, base, journal_recharge, base_rechargee):
+        verifier_affectations(stockage.df.reset_index(drop=True), df_attendu)
+        for mois, annee in ((1, 2026), (2, 2026), (None, None)):
+            assert stockage.statistiques(mois, annee) == journal.statistiques(mois, annee)
+    assert journal.statistiques(1, 2026)['chauffeurs_taxi']
+
+
+@pytest.mark.parametrize("type_stockage", ["journal", "sqlite"])
+def test_valeurs_manquantes(tmp_path, type_stockage):
+    lignes = [affectation(i) for i in range(3)]
+    lignes[1]['Societe'] = None
+    # Ligne ajoutée sans véhicule ni statut de paiement
+    del lignes[2]['Vehicule'], lignes[2]['Statut_Paiement']
+    stockage = ouvrir_stockage(type_stockage, str(tmp_path / "affectations.xlsx"))
+    stockage.ajouter(lignes)
+
+    for df in (stockage.df, ouvrir_stockage(type_stockage, str(tmp_path / "affectations.xlsx")).df):
+        df = df.reset_index(drop=True)
+        assert df['Societe'].isna().tolist() == [False, True, False]
+        assert df['Vehicule'].isna().tolist() == [False, False, True]
+        assert df['Statut_Paiement'].isna().tolist() == [False, False, True]
+        assert 'nan' not in df['Societe'].cat.categories
+    assert stockage.statistiques(1, 2026)['societes_normaux'] == {"Astragale": 2}
+
+
+def contenu_fichiers(dossier):
+    """{nom : octets} des fichiers du dossier"""
+    return {nom: (dossier / nom).read_bytes() for nom in sorted(os.listdir(dossier))}
+
+
+def test_journal_lecture_seule(tmp_path, fichier_sauvegarde):
+    lignes = [affectation(i) for i in range(3)]
+    # Ancienne sauvegarde xlsx à migrer et journal au seuil de compactage : rien ne doit être écrit
+    pd.DataFrame(lignes[:2], columns=COLONNES_AFFECTATIONS).to_excel(fichier_sauvegarde, index=False)
+    with open(fichier_sauvegarde + ".journal", 'w', encoding='utf-8') as fichier:
+        fichier.write(json.dumps({'seq': 1, 'op': 'ajout', 'ids': [2], 'lignes': [lignes[2]]}) + "\n")
+    fichiers = contenu_fichiers(tmp_path)
+
+    lecture = JournalAffectations(fichier_sauvegarde, seuil_compactage=1, lecture_seule=True)
+
+    assert lecture.erreur_chargement is None
+    verifier_affectations(lecture.df, attendu(lignes, [0, 1, 2]))
+    with pytest.raises(PermissionError):
+        lecture.ajouter(lignes[:1])
+    with pytest.raises(PermissionError):
+        lecture.compacter()
+    assert contenu_fichiers(tmp_path) == fichiers
+
+
+def test_journal_lecture_seule_pendant_compactage(monkeypatch, fichier_sauvegarde):
+    lignes = [affectation(i) for i in range(3)]
+    journal = JournalAffectations(fichier_sauvegarde)
+    journal.ajouter(lignes[:2])
+    journal.compacter()
+    journal.ajouter(lignes[2:])
+
+    # L'application compacte entre la lecture de l'instantané et celle du journal
+    lire_journal = JournalAffectations.lire_journal
+    def lire_journal_puis_compacter(stockage, fichier_journal):
+        if stockage is not journal and journal.nb_operations_journal:
+            journal.compacter()
+        return lire_journal(stockage, fichier_journal)
+    monkeypatch.setattr(JournalAffectations, 'lire_journal', lire_journal_puis_compacter)
+
+    lecture = JournalAffectations(fichier_sauvegarde, lecture_seule=True)
+
+    assert lecture.erreur_chargement is None
+    verifier_affectations(lecture.df, attendu(lignes, [0, 1, 2]))
+
+
+def test_sqlite_lecture_seule(tmp_path, fichier_sauvegarde):
+    lignes = [affectation(i) for i in range(3)]
+    JournalAffectations(fichier_sauvegarde).ajouter(lignes)
+    fichiers = contenu_fichiers(tmp_path)
+
+    # Base pas encore créée : la sauvegarde est importée en mémoire
+    lecture = ouvrir_stockage("sqlite", fichier_sauvegarde, lecture_seule=True)
+
+    assert lecture.erreur_chargement is None
+    verifier_affectations(lecture.df, attendu(lignes, [1, 2, 3]))
+    assert contenu_fichiers(tmp_path) == fichiers
+
+    ouvrir_stockage("sqlite", fichier_sauvegarde).connexion.close()
+    lecture = ouvrir_stockage("sqlite", fichier_sauvegarde, lecture_seule=True)
+
+    assert lecture.erreur_chargement is None
+    verifier_affectations(lecture.df, attendu(lignes, [1, 2, 3]))
+    with pytest.raises(PermissionError):
+        lecture.supprimer([1])
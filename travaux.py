@@ -0,0 +1,177 @@
+"""Travaux en arrière-plan : rapports et exports générés dans un pool de processus
+
+Le script Streamlit soumet un travail avec une clé (tout ce qui détermine le
+fichier produit) et continue son exécution ; l'interface interroge ensuite
+l'état et la progression du travail. Un travail déjà lancé ou déjà terminé
+avec la même clé est réutilisé : plusieurs sessions qui demandent le même
+rapport partagent un seul calcul. Les résultats terminés restent en cache
+(nombre borné, les plus anciens sont évincés).
+
+Les fonctions de travail (travail_*) s'exécutent dans les processus du pool :
+elles reçoivent l'état détaché du moteur (DataFrames, listes, prix) et non
+l'instance liée à la session.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+ETAT_EN_ATTENTE = "en attente"
+ETAT_EN_COURS = "en cours"
+ETAT_TERMINE = "terminé"
+ETAT_ECHEC = "échec"
+
+# File de progression héritée par chaque processus du pool (voir initialiser_processus)
+file_progression = None
+
+
+class Travail:
+    """État d'un travail soumis au pool"""
+    def __init__(self, cle, libelle):
+        self.cle = cle
+        self.libelle = libelle
+        self.etat = ETAT_EN_ATTENTE
+        self.progression = 0.0
+        self.message = "En attente d'un processus libre"
+        self.resultat = None
+        self.erreur = None
+        self.soumis_le = time.time()
+        self.duree = None
+
+    @property
+    def fini(self):
+        return self.etat in (ETAT_TERMINE, ETAT_ECHEC)
+
+
+class GestionnaireTravaux:
+    """Pool de processus, états des travaux et cache borné des résultats"""
+    def __init__(self, nb_processus=None, taille_cache=32):
+        self.nb_processus = nb_processus or max(1, min(4, os.cpu_count() or 1))
+        self.taille_cache = taille_cache
+        self.verrou = threading.Lock()
+        self.travaux = OrderedDict()
+        self.pool = None
+        self.file_progression = None
+
+    def demarrer(self):
+        """Crée le pool au premier travail ("spawn" : processus propres, sûrs avec les threads de Streamlit)"""
+        contexte = multiprocessing.get_context("spawn")
+        self.file_progression = contexte.Queue()
+        self.pool = ProcessPoolExecutor(self.nb_processus, mp_context=contexte,
+                                        initializer=initialiser_processus, initargs=(self.file_progression,))
+        threading.Thread(target=self.suivre_progression, daemon=True).start()
+
+    def soumettre(self, cle, libelle, fonction, *args):
+        """Lance fonction(signaler, *args) dans le pool, sauf si un travail de même clé existe déjà"""
+        with self.verrou:
+            travail = self.travaux.get(cle)
+            if travail is not None and travail.etat != ETAT_ECHEC:
+                self.travaux.move_to_end(cle)
+                return travail
+
+            if self.pool is None:
+                self.demarrer()
+            travail = Travail(cle, libelle)
+            self.travaux[cle] = travail
+            self.evincer()
+
+        futur = self.pool.submit(executer_travail, cle, fonction, args)
+        futur.add_done_callback(lambda futur: self.terminer(travail, futur))
+        return travail
+
+    def obtenir(self, cle):
+        with self.verrou:
+            return self.travaux.get(cle)
+
+    def terminer(self, travail, futur):
+        with self.verrou:
+            travail.duree = time.time() - travail.soumis_le
+            travail.progression = 1.0
+            if futur.exception() is not None:
+                travail.etat = ETAT_ECHEC
+                travail.erreur = str(futur.exception())
+                travail.message = "Échec"
+            else:
+                travail.etat = ETAT_TERMINE
+                travail.resultat = futur.result()
+                travail.message = "Terminé"
+
+    def evincer(self):
+        """Garde au plus taille_cache travaux terminés (les travaux en cours ne sont jamais évincés)"""
+        termines = [cle for cle, travail in self.travaux.items() if travail.fini]
+        for cle in termines[:max(0, len(termines) - self.taille_cache)]:
+            del self.travaux[cle]
+
+    def suivre_progression(self):
+        """Reporte sur les travaux les progressions envoyées par les processus du pool"""
+        while True:
+            cle, progression, message = self.file_progression.get()
+            with self.verrou:
+                travail = self.travaux.get(cle)
+                if travail is not None and not travail.fini:
+                    travail.etat = ETAT_EN_COURS
+                    travail.progression = progression
+                    travail.message = message
+
+    def statistiques(self):
+        with self.verrou:
+            etats = [travail.etat for travail in self.travaux.values()]
+        return {etat: etats.count(etat) for etat in (ETAT_EN_ATTENTE, ETAT_EN_COURS, ETAT_TERMINE, ETAT_ECHEC)}
+
+
+def initialiser_processus(file):
+    global file_progression
+    file_progression = file
+
+
+def executer_travail(cle, fonction, args):
+    """Point d'entrée dans le processus du pool : fournit à la fonction de quoi signaler sa progression"""
+    def signaler(progression, message):
+        file_progression.put((cle, progression, message))
+
+    signaler(0.0, "Démarrage")
+    return fonction(signaler, *args)
+
+
+def travail_rapport_paie(signaler, etat, mois, annee):
+    """Rapport de paie : (DataFrame affiché, fichier Excel) ou None"""
+    from moteur import MoteurTransport, ecrire_xlsx_flux
+
+    signaler(0.1, "Calcul des cumuls de paie")
+    gestion = MoteurTransport.depuis_etat_detache(etat)
+    gestion.reconstruire_agregats()
+    rapport = gestion.generer_rapport_paie_mensuel(mois, annee)
+    if rapport is None:
+        return None
+
+    signaler(0.6, "Écriture du fichier Excel")
+    return rapport, ecrire_xlsx_flux(rapport.itertuples(index=False, name=None), f'Paie_{mois}_{annee}')
+
+
+def travail_suivi_chauffeurs(signaler, etat, jour):
+    """Export du suivi des chauffeurs (fichier Excel) ou None"""
+    from moteur import MoteurTransport
+
+    signaler(0.1, "Regroupement des courses")
+    gestion = MoteurTransport.depuis_etat_detache(etat)
+    return gestion.exporter_suivi_chauffeurs_xlsx(jour)
+
+
+def travail_liste_imprimable(signaler, etat, format_rapport, type_liste, jour):
+    """Liste de ramassage ou de départ imprimable, en Excel ou en PDF, ou None"""
+    from moteur import MoteurTransport, ecrire_xlsx_flux
+
+    gestion = MoteurTransport.depuis_etat_detache(etat)
+    liste, heures = gestion.obtenir_liste_imprimable(type_liste)
+    if jour != 'Tous':
+        liste = [agent for agent in liste if agent['Jour'] == jour]
+    if not liste:
+        return None
+
+    signaler(0.2, "Mise en page" if format_rapport == "pdf" else "Écriture du fichier Excel")
+    if format_rapport == "pdf":
+        return gestion.construire_pdf_imprimable(type_liste, jour, liste, heures)
+    nom_feuille = 'Liste_Ramassage' if type_liste == "ramassage" else 'Liste_Depart'
+    return ecrire_xlsx_flux(gestion.lignes_rapport_imprimable(type_liste, jour, liste, heures), nom_feuille)